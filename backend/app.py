@@ -1,5 +1,6 @@
 from flask import Flask, request
 from flask_cors import CORS
+from flask_jwt_extended import jwt_required
 from config import Config
 from extensions import db, bcrypt, jwt
 from routes.ai_routes import ai_bp
@@ -37,7 +38,7 @@ def add_cors_headers(response):
     origin = request.headers.get("Origin")
     if origin in ("http://localhost:5173", "http://127.0.0.1:5173"):
         response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Vary"] = "Origin"
+        response.vary.add("Origin")  # keep Accept-Encoding on compressed bodies
         response.headers["Access-Control-Allow-Credentials"] = "true"
         response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Session-Id"
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
@@ -49,5 +50,16 @@ def health_check():
     """Health check endpoint"""
     return {'status': 'healthy', 'message': 'Backend is running'}, 200
 
+
+@app.route('/api/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """In-process cache, latency and logging metrics for this worker"""
+    from services import metrics
+    from services.activity_logger import get_logger_stats
+    data = metrics.snapshot()
+    data['activity_logger'] = get_logger_stats()
+    return data, 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -26,3 +26,34 @@ class Config:
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    
+    # Activity log volume control
+    ACTIVITY_LOG_COALESCE_SECONDS = int(os.getenv('ACTIVITY_LOG_COALESCE_SECONDS', '30'))  # 0 disables coalescing
+    ACTIVITY_LOG_MAX_INFLIGHT = int(os.getenv('ACTIVITY_LOG_MAX_INFLIGHT', '16'))  # concurrent writes before shedding
+    ACTIVITY_LOG_SHED_SAMPLE_RATE = float(os.getenv('ACTIVITY_LOG_SHED_SAMPLE_RATE', '0.1'))  # fraction kept while saturated
+    
+    # Hourly rollups
+    ROLLUP_REFRESH_SECONDS = int(os.getenv('ROLLUP_REFRESH_SECONDS', '60'))  # min interval between on-read refreshes
+    
+    # Analytics caching
+    ANOMALY_CACHE_TTL_SECONDS = int(os.getenv('ANOMALY_CACHE_TTL_SECONDS', '300'))  # reuse detector results this long
+    DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', '15'))  # dashboard-stats per `days`
+    
+    # Alert stream (Server-Sent Events)
+    ALERT_STREAM_POLL_SECONDS = float(os.getenv('ALERT_STREAM_POLL_SECONDS', '5'))  # DB poll for events from other workers
+    ALERT_STREAM_MAX_SECONDS = int(os.getenv('ALERT_STREAM_MAX_SECONDS', '300'))  # stream ends, client resumes via Last-Event-ID
+    
+    # Response encoding
+    RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))  # smaller JSON bodies are sent uncompressed
+    
+    # Dashboard bundle endpoint
+    BUNDLE_MAX_WORKERS = int(os.getenv('BUNDLE_MAX_WORKERS', '4'))  # sections run concurrently; 1 runs them inline on one DB session
+    
+    # ask-sql question -> SQL template cache
+    SQL_TEMPLATE_CACHE_TTL_SECONDS = int(os.getenv('SQL_TEMPLATE_CACHE_TTL_SECONDS', '3600'))
+    
+    # ask-sql execution: dedicated connection pool, statement timeout and EXPLAIN cost limit
+    ASK_SQL_POOL_SIZE = int(os.getenv('ASK_SQL_POOL_SIZE', '2'))  # connections; no overflow
+    ASK_SQL_POOL_TIMEOUT_SECONDS = int(os.getenv('ASK_SQL_POOL_TIMEOUT_SECONDS', '5'))  # wait for a free connection, then 503
+    ASK_SQL_TIMEOUT_SECONDS = float(os.getenv('ASK_SQL_TIMEOUT_SECONDS', '10'))  # server-side per-statement limit
+    ASK_SQL_MAX_EXAMINED_ROWS = int(os.getenv('ASK_SQL_MAX_EXAMINED_ROWS', '1000000'))  # EXPLAIN estimate above this is rejected
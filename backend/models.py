@@ -106,6 +106,7 @@ class UserLog(db.Model):
     geo_location = db.Column(db.String(100))
     is_flagged = db.Column(db.Boolean, default=False)
     log_type = db.Column(db.Enum('ui_event', 'system', 'auth', 'data_access'), default='ui_event')
+    event_count = db.Column(db.Integer, default=1)  # >1 when repeated events were coalesced into this row
     
     def to_dict(self):
         return {
@@ -117,6 +118,7 @@ class UserLog(db.Model):
             'page_url': self.page_url,
             'ip_address': self.ip_address,
             'user_agent': self.user_agent,
+            'event_count': self.event_count or 1,
             'timestamp': self.log_timestamp.isoformat() if self.log_timestamp else None
         }
 
@@ -151,6 +153,13 @@ class AnomalyScore(db.Model):
     explanation = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Structured detector output, persisted at detection time
+    per_feature_stats = db.Column(db.JSON)
+    causes_detail = db.Column(db.JSON)
+    findings = db.Column(db.JSON)
+    std_pct = db.Column(db.Integer)
+    deviation_pct = db.Column(db.Integer)
+    
     # Relationships
     user = db.relationship('User', backref='anomaly_scores')
     
@@ -164,6 +173,11 @@ class AnomalyScore(db.Model):
             'risk_score': float(self.risk_score) if self.risk_score else None,
             'risk_level': self.risk_level,
             'explanation': self.explanation,
+            'per_feature_stats': self.per_feature_stats,
+            'causes_detail': self.causes_detail,
+            'std_pct': self.std_pct,
+            'deviation_pct': self.deviation_pct,
+            'findings': self.findings,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -221,3 +235,55 @@ class RuleBasedDetection(db.Model):
             'explanation': self.explanation,
             'detected_at': self.detected_at.isoformat() if self.detected_at else None
         }
+
+
+class ActivityRollup(db.Model):
+    """Hourly activity counts per user and action type, maintained from user_logs"""
+    __tablename__ = 'activity_rollup_hourly'
+    
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 for logs without a user
+    action_type = db.Column(db.String(50), primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SecurityRollup(db.Model):
+    """Hourly anomaly score and flag counts per user and severity"""
+    __tablename__ = 'security_rollup_hourly'
+    
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 for rows without a user
+    source = db.Column(db.Enum('anomaly_score', 'flag'), primary_key=True)
+    severity = db.Column(db.String(20), primary_key=True)  # risk_level for scores, severity for flags
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class RollupWatermark(db.Model):
+    """Highest source row id already folded into the rollup tables"""
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserRiskDaily(db.Model):
+    """Per-user daily risk series, updated as detections and flags are persisted"""
+    __tablename__ = 'user_risk_daily'
+    
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    max_score = db.Column(db.Numeric(5, 2), nullable=False, default=0)
+    score_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    detections = db.Column(db.Integer, nullable=False, default=0)  # anomaly scores + rule-based detections
+    flags = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'max_score': float(self.max_score or 0),
+            'avg_score': round(float(self.score_sum or 0) / self.detections, 2) if self.detections else 0.0,
+            'detections': self.detections,
+            'flags': self.flags
+        }
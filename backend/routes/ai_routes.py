@@ -1,23 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from sqlalchemy import text
-from services.llm_client import chat as llm_chat
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from services.llm_client import chat as llm_chat, chat_stream as llm_chat_stream, LLMBusy, LLM_MODEL, LLM_READ_TIMEOUT
+from services import chat_history, metrics, nl_sql, sql_exec, sql_results, sql_templates, explanations
+from services.nl_sql import COLS
 from services.sql_guard import validate_and_fix
-from extensions import db
-import json, re
+from services.responses import json_response, dumps
 
 ai_bp = Blueprint("ai", __name__, url_prefix="/api/ai")
 
-COLS = (
-    "log_id,user_id,action_type,action_detail,page_url,ip_address,"
-    "log_timestamp,session_id,user_agent,geo_location,is_flagged,log_type"
-)
-
-EXPLAIN_SYSTEM = (
-    "You are a security analyst. Using ONLY the information provided, write one short paragraph "
-    "(max 120 words) explaining what the SQL result shows and any notable signals. "
-    "Be cautious—do not invent facts. If there are zero rows, say so. Keep it concise and useful to an admin."
-)
-
 SQL_SYSTEM_PROMPT = (
     "Translate the user's English request into ONE safe MySQL SELECT over these tables:\n"
     "user_logs(log_id,user_id,action_type,action_detail,page_url,ip_address,log_timestamp,session_id,user_agent,geo_location,is_flagged,log_type),\n"
@@ -45,6 +36,44 @@ CHAT_SYSTEM = (
     "If the user asks about data, suggest using the Ask Data box (NL→SQL)."
 )
 
+@ai_bp.errorhandler(LLMBusy)
+def llm_busy(e):
+    """Every LLM slot is taken and the queue is full: tell the client when to retry"""
+    response = jsonify({"error": "LLM busy", "detail": str(e), "retry_after": e.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def stream_reply(messages, temperature):
+    """NDJSON response relaying the reply as it is generated.
+
+    Lines are {"delta": "..."} followed by {"done": true} (or {"error": ..., "done": true}).
+    If the client disconnects, the generator is closed and the Ollama request with it.
+    """
+    chunks = llm_chat_stream(messages, temperature=temperature)
+    try:
+        # Pull the first chunk now so an unreachable LLM is still a plain 503
+        first = next(chunks, None)
+    except LLMBusy as e:
+        return llm_busy(e)
+    except Exception as e:
+        return jsonify({"error": "LLM unavailable", "detail": str(e)}), 503
+
+    def generate():
+        try:
+            if first is not None:
+                yield dumps({"delta": first}) + b"\n"
+            for chunk in chunks:
+                yield dumps({"delta": chunk}) + b"\n"
+            yield dumps({"done": True}) + b"\n"
+        except RuntimeError as e:
+            yield dumps({"error": "LLM unavailable", "detail": str(e), "done": True}) + b"\n"
+        finally:
+            chunks.close()
+
+    return Response(generate(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @ai_bp.route("/chat", methods=["POST", "OPTIONS"])
 def chat_route():
     if request.method == "OPTIONS":
@@ -54,12 +83,21 @@ def chat_route():
     message  = data.get("message", "")
     history  = data.get("history", [])
 
+    # Older turns are summarized so the prompt stays within the model's context
+    msgs = chat_history.compact([*history, {"role":"user","content": message}])
+
+    # {"stream": true} relays tokens as NDJSON instead of waiting for the whole reply
+    if data.get("stream"):
+        return stream_reply(msgs, temperature=0.2)
+
     try:
         reply = llm_chat(
-            messages=[*history, {"role":"user","content": message}],
+            messages=msgs,
             temperature=0.2,
         )
         return jsonify({"reply": reply})
+    except LLMBusy as e:
+        return llm_busy(e)
     except Exception as e:
         return jsonify({"error": "LLM unavailable", "detail": str(e)}), 503
     
@@ -70,57 +108,26 @@ def ask_sql():
     if not q:
         return jsonify({"error": "missing_question"}), 400
 
-    q_lc = q.lower()
-
-    # 1) multiple logs in a range
-    m = re.search(r'\blogs?\s*(\d+)\s*(?:-|to)\s*(\d+)\b', q_lc)
-    if m:
-        a, b = int(m.group(1)), int(m.group(2))
-        lo, hi = (a, b) if a <= b else (b, a)
-        span = min(hi - lo + 1, 200)
-        sql = (
-            f"SELECT {COLS} FROM user_logs "
-            f"WHERE log_id BETWEEN {lo} AND {hi} "
-            f"ORDER BY log_id ASC LIMIT {span}"
-        )
+    from_llm = False
 
+    # 1) common analyst questions compile straight to parameterized SQL
+    compiled = nl_sql.compile_question(q)
+    if compiled:
+        sql, params = compiled
+        metrics.incr("nl_sql.compiled")
     else:
-        # 2) multiple explicit logs
-        m = re.search(r'\blogs?\s+((?:\d+[,\s]+)+\d+)\b', q_lc)
-        if m:
-            nums = [int(x) for x in re.findall(r'\d+', m.group(1))]
-            ids = sorted(set(nums))[:200]
-            id_list = ",".join(str(x) for x in ids)
-            sql = (
-                f"SELECT {COLS} FROM user_logs "
-                f"WHERE log_id IN ({id_list}) "
-                f"ORDER BY log_id ASC LIMIT {len(ids)}"
-            )
-
-        else:
-            # 3) deals with single ids
-            m = re.search(r'\b(?:log_id|log)\s*[:#]?\s*(\d+)\b', q_lc)
-            if m:
-                log_id = int(m.group(1))
-                sql = f"SELECT {COLS} FROM user_logs WHERE log_id = {log_id} LIMIT 1"
-
-            else:
-                # 4) deals with nth role by time
-                m = re.search(r'\brow\s+(\d+)\b', q_lc)
-                if m:
-                    n = max(1, int(m.group(1)))
-                    sql = (
-                        f"SELECT {COLS} FROM user_logs "
-                        f"ORDER BY log_timestamp ASC LIMIT 1 OFFSET {n-1}"
-                    )
-                else:
-                    # 5) fallback to the LLM prompt
-                    messages = [
-                        {"role": "system", "content": SQL_SYSTEM_PROMPT},
-                        {"role": "user", "content": q}
-                    ]
-                    out = llm_chat(messages, json_mode=True, temperature=0.0) or {}
-                    sql = (out.get("sql") or "").strip()
+        params = {}
+        # 2) reuse SQL generated earlier for the same question shape
+        sql = sql_templates.lookup(q, SQL_SYSTEM_PROMPT, LLM_MODEL)
+        if not sql:
+            # 3) fallback to the LLM prompt
+            messages = [
+                {"role": "system", "content": SQL_SYSTEM_PROMPT},
+                {"role": "user", "content": q}
+            ]
+            out = llm_chat(messages, json_mode=True, temperature=0.0) or {}
+            sql = (out.get("sql") or "").strip()
+            from_llm = True
 
     # Guard (read-only, LIMIT, etc.)
     try:
@@ -128,34 +135,79 @@ def ask_sql():
     except Exception as e:
         return jsonify({"error": "unsafe_sql", "message": str(e), "llm_sql": sql}), 400
 
-    # Execute
+    # Execute on the ask-sql pool, unless the same query already ran since the last new log/session.
+    # SQL that did not come from the question grammar is costed with EXPLAIN first.
     try:
-        with db.engine.connect() as conn:
-            result = conn.execute(text(sql))
-            rows = [list(r) for r in result.fetchall()]
-            cols = list(result.keys())
+        with sql_exec.get_engine().connect() as conn:
+            version = sql_results.data_version(conn)
+            cached = sql_results.lookup(sql, params, version)
+            if cached:
+                cols, rows = cached
+            else:
+                if not compiled:
+                    sql_exec.check_cost(conn, sql, params)
+                with metrics.timed("ask_sql.execute"):
+                    result = conn.execute(text(sql), params)
+                    rows = [list(r) for r in result.fetchall()]
+                    cols = list(result.keys())
+                sql_results.store(sql, params, version, cols, rows)
+    except sql_exec.QueryRejected as e:
+        return jsonify({"error": "too_expensive", "message": str(e), "estimated_rows": e.estimated_rows, "sql": sql}), 400
+    except PoolTimeoutError:
+        return jsonify({"error": "busy", "message": "Too many ask-sql queries running, try again shortly"}), 503
     except Exception as e:
+        if sql_exec.is_timeout(e):
+            metrics.incr("ask_sql.timeouts")
+            return jsonify({"error": "query_timeout", "message": str(e), "sql": sql}), 400
         return jsonify({"error": "db_error", "message": str(e), "sql": sql}), 400
 
-    # Explanation (second pass, based on actual rows)
-    explanation = None
-    try:
-        context = {
-            "question": q,
-            "sql": sql,
-            "columns": cols,
-            "sample_rows": rows[:20],
-            "row_count": len(rows),
-        }
-        msgs = [
-            {"role": "system", "content": EXPLAIN_SYSTEM},
-            {"role": "user", "content": json.dumps(context, ensure_ascii=False)},
-        ]
-        explanation = llm_chat(msgs, temperature=0.2)
-    except Exception:
-        explanation = None
-
-    return jsonify({"sql": sql, "columns": cols, "rows": rows, "explanation": explanation})
+    # Only SQL that validated and ran is reused for later questions of the same shape
+    if from_llm:
+        sql_templates.store(q, sql, SQL_SYSTEM_PROMPT, LLM_MODEL)
+
+    # Explanation (second pass, based on actual rows) runs in the background;
+    # fetch or stream it via /api/ai/explanations/<explanation_id>
+    explanation = explanations.submit(q, sql, cols, rows, params).to_dict()
+
+    return json_response({
+        "sql": sql,
+        "params": params,
+        "columns": cols,
+        "rows": rows,
+        "cached": cached is not None,
+        "explanation": explanation["explanation"],
+        "explanation_id": explanation["explanation_id"],
+        "explanation_status": explanation["status"],
+    })
+
+@ai_bp.get("/explanations/<handle>")
+def get_explanation(handle):
+    """Explanation status/text; ?wait=N blocks up to N seconds (max 30) for it to finish"""
+    entry = explanations.get(handle)
+    if entry is None:
+        return jsonify({"error": "unknown_explanation"}), 404
+    wait = min(request.args.get("wait", 0, type=float), 30)
+    if wait > 0:
+        explanations.wait(entry, wait)
+    return jsonify(entry.to_dict())
+
+@ai_bp.get("/explanations/<handle>/stream")
+def stream_explanation(handle):
+    """NDJSON stream of the explanation as it is generated ({"delta"} lines, then {"done"})"""
+    entry = explanations.get(handle)
+    if entry is None:
+        return jsonify({"error": "unknown_explanation"}), 404
+
+    def generate():
+        try:
+            for chunk in explanations.iter_chunks(entry, timeout=LLM_READ_TIMEOUT):
+                yield dumps({"delta": chunk}) + b"\n"
+            yield dumps({"done": True}) + b"\n"
+        except RuntimeError as e:
+            yield dumps({"error": "explanation_failed", "detail": str(e), "done": True}) + b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @ai_bp.post("/chat")
 def chat():
@@ -167,6 +219,10 @@ def chat():
     msgs.extend(history)
     if user_msg:
         msgs.append({"role":"user","content": user_msg})
+    msgs = chat_history.compact(msgs)
+
+    if (data or {}).get("stream"):
+        return stream_reply(msgs, temperature=0.4)
 
     reply = llm_chat(msgs, temperature=0.4)
     return jsonify({"reply": reply})
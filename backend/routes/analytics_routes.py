@@ -1,13 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
-from models import AnomalyScore, FlaggedActivity, UserLog, RuleBasedDetection, User
+from models import AnomalyScore, FlaggedActivity, UserLog, RuleBasedDetection, User, Role
 from datetime import datetime, timedelta
-from services.detection import compute_anomaly_scores
+import time
+from services.detection import cached_compute_anomaly_scores
 from services.rule_detection import RuleBasedDetection as RuleDetector
+from services.rollups import activity_counts, security_counts
+from services import risk_series, event_stream, etags
+from services.cache import TTLCache
+from services.serializers import eager
+from services.responses import json_array_response
+from services.bundle import BUNDLE_SECTIONS, MAX_SECTIONS, run_bundle
 
 bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
 
+# Dashboard statistics per `days` value; short TTL since the page is polled all day
+dashboard_stats_cache = TTLCache('dashboard_stats_cache', ttl=15, maxsize=32)
+
 def get_current_user_id():
     """Helper to get user ID as integer from JWT"""
     return int(get_jwt_identity())
@@ -28,52 +38,23 @@ def get_anomaly_scores():
         query = AnomalyScore.query.join(User, AnomalyScore.user_id == User.user_id).filter(AnomalyScore.created_at >= start_date)
 
         if user_id:
-            query = query.filter_by(user_id=user_id)
+            query = query.filter(AnomalyScore.user_id == user_id)
 
         if risk_level:
-            query = query.filter_by(risk_level=risk_level)
-
-        scores = query.order_by(AnomalyScore.created_at.desc()).all()
-
-        # Convert to dicts for the API and detect whether enrichment is needed
-        score_dicts = [s.to_dict() for s in scores]
-        need_enrich = any(not d.get('explanation') or 'Auto-generated risk' in (d.get('explanation') or '') for d in score_dicts)
-
-        # If some rows look like legacy seeded rows (Auto-generated risk...) then run the baseline detector once
-        # and merge enriched structured fields for matching users. This avoids showing the old seed text.
-        if need_enrich:
-            try:
-                enriched = compute_anomaly_scores(days=30, obs_hours=24)
-                # Build map user_id -> latest enriched record
-                enrich_map = {}
-                for e in enriched:
-                    uid = e.get('user_id')
-                    if uid is None:
-                        continue
-                    # prefer highest risk_score per user
-                    existing = enrich_map.get(uid)
-                    if not existing or int(e.get('risk_score', 0)) > int(existing.get('risk_score', 0)):
-                        enrich_map[uid] = e
-
-                # Merge into score_dicts when missing structured fields
-                for d in score_dicts:
-                    if (not d.get('explanation') or 'Auto-generated risk' in (d.get('explanation') or '')):
-                        em = enrich_map.get(d.get('user_id'))
-                        if em:
-                            # Merge selected fields
-                            for key in ('per_feature_stats', 'causes_detail', 'std_pct', 'deviation_pct', 'findings', 'explanation'):
-                                if em.get(key) is not None:
-                                    d[key] = em.get(key)
-                            # Also prefer friendly user fields (username, role_name) from the enriched output
-                            if em.get('username'):
-                                d['username'] = em.get('username')
-                            if em.get('role_name'):
-                                d['role_name'] = em.get('role_name')
-            except Exception:
-                # If enrichment fails, fall back to seeded rows unchanged
-                pass
-
-        return jsonify(score_dicts), 200
+            query = query.filter(AnomalyScore.risk_level == risk_level)
+
+        # Deduped detections refresh created_at in place, so it is part of the version
+        etag = etags.make_etag(etags.version_token(
+            query, db.func.max(AnomalyScore.score_id), db.func.max(AnomalyScore.created_at)
+        ))
+        if etags.is_fresh(etag):
+            return etags.not_modified(etag)
+
+        scores = eager(query, AnomalyScore).order_by(AnomalyScore.created_at.desc()).all()
+
+        # Structured fields are persisted at detection time; legacy rows are
+        # enriched once by scripts/enrich_anomaly_scores.py
+        return etags.tag(json_array_response(scores, serialize=AnomalyScore.to_dict), etag), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -94,9 +75,72 @@ def get_flagged_activities():
         if severity:
             query = query.filter_by(severity=severity)
         
+        etag = etags.make_etag(etags.version_token(query, db.func.max(FlaggedActivity.flag_id)))
+        if etags.is_fresh(etag):
+            return etags.not_modified(etag)
+        
         activities = query.order_by(FlaggedActivity.flagged_at.desc()).all()
         
-        return jsonify([activity.to_dict() for activity in activities]), 200
+        return etags.tag(jsonify([activity.to_dict() for activity in activities]), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/alerts/stream', methods=['GET'])
+@jwt_required()
+def stream_alerts():
+    """Server-Sent Events stream of newly saved rule detections, anomaly scores and flags"""
+    try:
+        # Optional comma-separated filter, e.g. ?severity=High,Critical
+        severity = request.args.get('severity')
+        severities = {s.strip().lower() for s in severity.split(',') if s.strip()} if severity else None
+        
+        # Resume after the last delivered event, otherwise start from now
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            marks = event_stream.decode_event_id(last_event_id) if last_event_id else event_stream.latest_marks()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        db.session.rollback()
+        
+        poll_seconds = current_app.config.get('ALERT_STREAM_POLL_SECONDS', 5)
+        max_seconds = current_app.config.get('ALERT_STREAM_MAX_SECONDS', 300)
+        json_provider = current_app.json
+        
+        def generate():
+            nonlocal marks
+            # Clients reconnect with Last-Event-ID when the stream ends or drops. The preamble
+            # and every keep-alive carry the current marks as id, so a stream that delivers
+            # no event still leaves the client a resume point for events saved while it reconnects
+            yield f'retry: {int(poll_seconds * 1000)}\nid: {event_stream.encode_event_id(marks)}\n\n'
+            deadline = time.monotonic() + max_seconds
+            while True:
+                version = event_stream.current_version()
+                try:
+                    events, marks = event_stream.fetch_events(marks, severities)
+                    messages = [
+                        f'id: {event_id}\nevent: {name}\ndata: {json_provider.dumps(row.to_dict())}\n\n'
+                        for name, row, event_id in events
+                    ]
+                finally:
+                    # End the transaction so the next round sees newly committed rows
+                    db.session.rollback()
+                
+                if messages:
+                    yield ''.join(messages)
+                else:
+                    yield f': keep-alive\nid: {event_stream.encode_event_id(marks)}\n\n'
+                
+                if time.monotonic() >= deadline:
+                    break
+                event_stream.wait_for_change(version, poll_seconds)
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -110,42 +154,86 @@ def get_dashboard_stats():
         user_id = get_current_user_id()
         days = request.args.get('days', 7, type=int)
         
+        cached = dashboard_stats_cache.get(days)
+        if cached is not None:
+            return jsonify(cached), 200
+        
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get total activities
-        total_activities = UserLog.query.filter(
-            UserLog.log_timestamp >= start_date
-        ).count()
+        # Counts come from the hourly rollups
+        total_activities = sum(count for _, _, count in activity_counts(start_date))
+        security = security_counts(start_date)
         
-        # Get high risk alerts
-        high_risk_alerts = AnomalyScore.query.filter(
-            AnomalyScore.created_at >= start_date,
-            AnomalyScore.risk_level == 'High Alert'
-        ).count()
-        
-        # Get flagged activities by severity
-        flagged_critical = FlaggedActivity.query.filter(
-            FlaggedActivity.flagged_at >= start_date,
-            FlaggedActivity.severity == 'Critical'
-        ).count()
-        
-        flagged_high = FlaggedActivity.query.filter(
-            FlaggedActivity.flagged_at >= start_date,
-            FlaggedActivity.severity == 'High'
-        ).count()
-        
-        # Get recent anomaly scores
-        recent_scores = AnomalyScore.query.filter(
+        high_risk_alerts = security.get(('anomaly_score', 'High Alert'), (0, 0))[0]
+        flagged_critical = security.get(('flag', 'Critical'), (0, 0))[0]
+        flagged_high = security.get(('flag', 'High'), (0, 0))[0]
+        
+        # Get recent anomaly scores with their user and role in the same query
+        recent_scores = eager(AnomalyScore.query, AnomalyScore).filter(
             AnomalyScore.created_at >= start_date
         ).order_by(AnomalyScore.created_at.desc()).limit(10).all()
         
-        return jsonify({
+        stats = {
             'period_days': days,
             'total_activities': total_activities,
             'high_risk_alerts': high_risk_alerts,
             'flagged_critical': flagged_critical,
             'flagged_high': flagged_high,
             'recent_anomaly_scores': [score.to_dict() for score in recent_scores]
+        }
+        dashboard_stats_cache.set(days, stats, ttl=current_app.config.get('DASHBOARD_CACHE_TTL_SECONDS', 15))
+        
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/bundle', methods=['POST'])
+@jwt_required()
+def get_bundle():
+    """
+    Run several analytics reads in one round trip
+    
+    Body: {"sections": [{"name": "top_anomalies", "params": {"top": 10}}, ...]}
+    A section may also be given as its bare name ("dashboard_stats"); malformed sections
+    are rejected with 400. Each section may set "key" to name its result (defaults to
+    name). The JWT is checked once for the whole bundle; sections report their own
+    status and timing.
+    """
+    try:
+        started = time.perf_counter()
+        data = request.get_json(silent=True)
+        sections = data.get('sections') if isinstance(data, dict) else None
+        
+        if not isinstance(sections, list) or not sections:
+            return jsonify({'error': 'sections must be a non-empty list'}), 400
+        if len(sections) > MAX_SECTIONS:
+            return jsonify({'error': f'At most {MAX_SECTIONS} sections per bundle'}), 400
+        
+        parsed = []
+        for section in sections:
+            # A bare name is shorthand for {"name": name}
+            if isinstance(section, str):
+                section = {'name': section}
+            if not isinstance(section, dict):
+                return jsonify({'error': 'Each section must be a name or an object with a name'}), 400
+            name = section.get('name')
+            if not isinstance(name, str) or name not in BUNDLE_SECTIONS:
+                return jsonify({'error': f'Unknown section: {name}', 'available': sorted(BUNDLE_SECTIONS)}), 400
+            key = section.get('key', name)
+            params = section.get('params') or {}
+            if not isinstance(key, str) or not isinstance(params, dict):
+                return jsonify({'error': f'Section {name}: key must be a string and params an object'}), 400
+            if any(key == k for k, _, _ in parsed):
+                return jsonify({'error': f'Duplicate section key: {key}'}), 400
+            parsed.append((key, name, params))
+        
+        results = run_bundle(parsed, session_id=request.headers.get('X-Session-Id'))
+        
+        return jsonify({
+            'sections': {key: results[key] for key, _, _ in parsed},
+            'total_ms': round(1000.0 * (time.perf_counter() - started), 2)
         }), 200
         
     except Exception as e:
@@ -159,7 +247,8 @@ def run_detection():
     Note: In production restrict this endpoint to admins only.
     """
     try:
-        results = compute_anomaly_scores(days=30)
+        # Concurrent dashboards share one run; results are reused until new logs arrive
+        results = cached_compute_anomaly_scores(days=30)
         return jsonify({'anomalies': results}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -168,6 +257,12 @@ def run_detection():
 @bp.route('/top-anomalies', methods=['GET'])
 @jwt_required()
 def get_top_anomalies():
+    """
+    Most recent rule-based detections and baseline anomaly scores, merged
+
+    Both tables are combined with UNION ALL in one query; a window function keeps the
+    highest risk_score per (user_id, session_id, triggered_rules) before ordering by time.
+    """
     try:
         top = request.args.get('top', 15, type=int)
         min_score = request.args.get('min_score', 0, type=int)
@@ -175,45 +270,94 @@ def get_top_anomalies():
 
         start_date = datetime.utcnow() - timedelta(days=days)
 
-        # Get recent RuleBasedDetection (only for users that exist in users table)
-        rule_q = RuleBasedDetection.query.join(User, RuleBasedDetection.user_id == User.user_id).filter(
+        etag = etags.make_etag(
+            etags.version_token(
+                RuleBasedDetection.query.filter(RuleBasedDetection.detected_at >= start_date, RuleBasedDetection.risk_score >= min_score),
+                db.func.max(RuleBasedDetection.detection_id)
+            ),
+            etags.version_token(
+                AnomalyScore.query.filter(AnomalyScore.created_at >= start_date, AnomalyScore.risk_score >= min_score),
+                db.func.max(AnomalyScore.score_id), db.func.max(AnomalyScore.created_at)
+            )
+        )
+        if etags.is_fresh(etag):
+            return etags.not_modified(etag)
+
+        # Rule-based detections (only for users that exist in users table)
+        rule_q = db.select(
+            db.literal('rule_detection').label('source'),
+            RuleBasedDetection.detection_id.label('row_id'),
+            RuleBasedDetection.user_id.label('user_id'),
+            User.username.label('username'),
+            Role.role_name.label('role_name'),
+            RuleBasedDetection.session_id.label('session_id'),
+            db.cast(RuleBasedDetection.risk_score, db.Numeric(5, 2)).label('risk_score'),
+            db.cast(RuleBasedDetection.risk_level, db.String(20)).label('risk_level'),
+            RuleBasedDetection.triggered_rules.label('triggered_rules'),
+            RuleBasedDetection.explanation.label('explanation'),
+            RuleBasedDetection.detected_at.label('ts')
+        ).join(User, RuleBasedDetection.user_id == User.user_id).outerjoin(
+            Role, User.role_id == Role.role_id
+        ).where(
             RuleBasedDetection.detected_at >= start_date,
             RuleBasedDetection.risk_score >= min_score
-        ).order_by(RuleBasedDetection.detected_at.desc()).limit(top)
-        rule_rows = rule_q.all()
+        )
 
-        # Get fallback/legacy AnomalyScore rows (only for existing users)
-        as_q = AnomalyScore.query.join(User, AnomalyScore.user_id == User.user_id).filter(
+        # Baseline AnomalyScore rows (only for existing users)
+        as_q = db.select(
+            db.literal('anomaly_score').label('source'),
+            AnomalyScore.score_id.label('row_id'),
+            AnomalyScore.user_id.label('user_id'),
+            User.username.label('username'),
+            Role.role_name.label('role_name'),
+            AnomalyScore.session_id.label('session_id'),
+            AnomalyScore.risk_score.label('risk_score'),
+            db.cast(AnomalyScore.risk_level, db.String(20)).label('risk_level'),
+            db.cast(db.null(), db.Text).label('triggered_rules'),
+            AnomalyScore.explanation.label('explanation'),
+            AnomalyScore.created_at.label('ts')
+        ).join(User, AnomalyScore.user_id == User.user_id).outerjoin(
+            Role, User.role_id == Role.role_id
+        ).where(
             AnomalyScore.created_at >= start_date,
             AnomalyScore.risk_score >= min_score
-        ).order_by(AnomalyScore.created_at.desc()).limit(top)
-        as_rows = as_q.all()
-
-        # Normalize to a common shape and merge-sort by timestamp
-        unified = []
-        for r in rule_rows:
-            d = r.to_dict()
-            d['source'] = 'rule_detection'
-            d['timestamp'] = d.get('detected_at')
-            unified.append(d)
-
-        for r in as_rows:
-            d = r.to_dict()
-            d['source'] = 'anomaly_score'
-            d['timestamp'] = d.get('created_at')
-            unified.append(d)
-
-        # Sort by timestamp desc and dedupe by (user_id, session_id, triggered_rules) keeping highest risk_score
-        grouped = {}
-        for d in unified:
-            key = (d.get('user_id'), d.get('session_id'), d.get('triggered_rules'))
-            existing = grouped.get(key)
-            if not existing or (d.get('risk_score', 0) > existing.get('risk_score', 0)):
-                grouped[key] = d
-
-        unified_top = sorted(grouped.values(), key=lambda x: x.get('timestamp') or '', reverse=True)[:top]
-
-        return jsonify({'anomalies': unified_top}), 200
+        )
+
+        unified = db.union_all(rule_q, as_q).subquery('unified')
+        ranked = db.select(
+            unified,
+            db.func.row_number().over(
+                partition_by=(unified.c.user_id, unified.c.session_id, unified.c.triggered_rules),
+                order_by=(unified.c.risk_score.desc(), unified.c.ts.desc())
+            ).label('rank_in_key')
+        ).subquery('ranked')
+        query = db.select(
+            *[c for c in ranked.c if c.name != 'rank_in_key']
+        ).where(ranked.c.rank_in_key == 1).order_by(ranked.c.ts.desc()).limit(top)
+
+        anomalies = []
+        for row in db.session.execute(query).mappings():
+            timestamp = row['ts'].isoformat() if row['ts'] else None
+            is_rule = row['source'] == 'rule_detection'
+            risk_score = row['risk_score']
+            anomalies.append({
+                'source': row['source'],
+                'detection_id': row['row_id'] if is_rule else None,
+                'score_id': None if is_rule else row['row_id'],
+                'user_id': row['user_id'],
+                'username': row['username'],
+                'role_name': row['role_name'],
+                'session_id': row['session_id'],
+                'risk_score': (int(risk_score) if is_rule else float(risk_score)) if risk_score is not None else None,
+                'risk_level': row['risk_level'],
+                'triggered_rules': row['triggered_rules'],
+                'explanation': row['explanation'],
+                'detected_at': timestamp if is_rule else None,
+                'created_at': None if is_rule else timestamp,
+                'timestamp': timestamp
+            })
+
+        return etags.tag(jsonify({'anomalies': anomalies}), etag), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -226,31 +370,58 @@ def get_user_risk_profile(user_id):
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get anomaly scores for user
-        scores = AnomalyScore.query.filter(
-            AnomalyScore.user_id == user_id,
-            AnomalyScore.created_at >= start_date
-        ).order_by(AnomalyScore.created_at.desc()).all()
+        # Totals come from the hourly rollups
+        security = security_counts(start_date, user_id=user_id)
+        score_count = sum(c for (source, _), (c, _) in security.items() if source == 'anomaly_score')
+        score_sum = sum(s for (source, _), (_, s) in security.items() if source == 'anomaly_score')
+        flag_count = sum(c for (source, _), (c, _) in security.items() if source == 'flag')
         
         # Calculate average risk score
-        if scores:
-            avg_score = sum(float(s.risk_score) for s in scores) / len(scores)
+        if score_count:
+            avg_score = float(score_sum) / score_count
         else:
             avg_score = 0
         
-        # Get flagged activities
-        flagged = db.session.query(FlaggedActivity).join(UserLog).filter(
-            UserLog.user_id == user_id,
-            FlaggedActivity.flagged_at >= start_date
-        ).all()
+        recent_scores = eager(AnomalyScore.query, AnomalyScore).filter(
+            AnomalyScore.user_id == user_id,
+            AnomalyScore.created_at >= start_date
+        ).order_by(AnomalyScore.created_at.desc()).limit(10).all()
         
         return jsonify({
             'user_id': user_id,
             'period_days': days,
             'average_risk_score': round(avg_score, 2),
-            'total_anomaly_detections': len(scores),
-            'total_flagged_activities': len(flagged),
-            'recent_scores': [score.to_dict() for score in scores[:10]]
+            'total_anomaly_detections': score_count,
+            'total_flagged_activities': flag_count,
+            'recent_scores': [score.to_dict() for score in recent_scores]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/user-risk-series/<int:user_id>', methods=['GET'])
+@jwt_required()
+def get_user_risk_series(user_id):
+    """Get a user's daily risk series (max/avg score, detections, flags) for a date range"""
+    try:
+        # start/end are inclusive YYYY-MM-DD days; default to the last 30 days
+        end_arg = request.args.get('end')
+        start_arg = request.args.get('start')
+        try:
+            end_day = datetime.strptime(end_arg, '%Y-%m-%d').date() if end_arg else datetime.utcnow().date()
+            start_day = datetime.strptime(start_arg, '%Y-%m-%d').date() if start_arg else end_day - timedelta(days=29)
+        except ValueError:
+            return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+        
+        if start_day > end_day:
+            return jsonify({'error': 'start must not be after end'}), 400
+        
+        return jsonify({
+            'user_id': user_id,
+            'start': start_day.isoformat(),
+            'end': end_day.isoformat(),
+            'series': risk_series.get_risk_series(user_id, start_day, end_day)
         }), 200
         
     except Exception as e:
@@ -271,13 +442,20 @@ def get_rule_based_detections():
         query = RuleBasedDetection.query.filter(
             RuleBasedDetection.detected_at >= start_date,
             RuleBasedDetection.risk_score >= min_score
-        ).order_by(RuleBasedDetection.detected_at.desc()).limit(top)
+        )
         
-        detections = query.all()
+        query = query.order_by(RuleBasedDetection.detected_at.desc()).limit(top)
         
-        return jsonify({
+        # Detections are never updated, so the ids on the page are its version
+        etag = etags.make_etag(etags.page_token(query, RuleBasedDetection.detection_id))
+        if etags.is_fresh(etag):
+            return etags.not_modified(etag)
+        
+        detections = eager(query, RuleBasedDetection).all()
+        
+        return etags.tag(jsonify({
             'detections': [d.to_dict() for d in detections]
-        }), 200
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -350,10 +528,13 @@ def run_rule_detection():
                 detected_at=d['detected_at']
             )
             db.session.add(detection)
+            risk_series.record_detection(d['user_id'], d['detected_at'], d['risk_score'])
             saved.append(d)
             saved_sessions.add(session_key)
         
         db.session.commit()
+        if saved:
+            event_stream.notify()
         
         return jsonify({
             'message': f'Detection completed. {len(saved)} new alerts, {skipped} duplicates skipped.',
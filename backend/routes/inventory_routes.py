@@ -34,6 +34,9 @@ def get_inventory():
         
         items = query.all()
         
+        # Serialize before logging: the log commit expires loaded rows
+        data = [item.to_dict() for item in items]
+        
         # Log the view activity
         logger.log_activity(
             user_id=user_id,
@@ -43,7 +46,7 @@ def get_inventory():
             request=request
         )
         
-        return jsonify([item.to_dict() for item in items]), 200
+        return jsonify(data), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,50 +1,169 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
 from models import UserLog, Session
+from services.activity_logger import ActivityLogger
+from services.pagination import keyset_page, page_query, clamp_page_size
+from services.rollups import activity_counts
+from services import etags
+from services.responses import json_response
 from datetime import datetime, timedelta
+import csv
+import io
+import json
 
 bp = Blueprint('logs', __name__, url_prefix='/api/logs')
+logger = ActivityLogger()
+
+# Columns written by the export endpoint, keyed like UserLog.to_dict()
+EXPORT_COLUMNS = [
+    ('log_id', UserLog.log_id),
+    ('user_id', UserLog.user_id),
+    ('session_id', UserLog.session_id),
+    ('action_type', UserLog.action_type),
+    ('action_detail', UserLog.action_detail),
+    ('page_url', UserLog.page_url),
+    ('ip_address', UserLog.ip_address),
+    ('user_agent', UserLog.user_agent),
+    ('event_count', UserLog.event_count),
+    ('timestamp', UserLog.log_timestamp),
+]
+EXPORT_BATCH_SIZE = 1000
 
 def get_current_user_id():
     """Helper to get user ID as integer from JWT"""
     return int(get_jwt_identity())
 
+def apply_log_filters(query, args):
+    """Apply the user_id / action_type / start_date / end_date filters shared by log listing endpoints"""
+    target_user_id = args.get('user_id', type=int)
+    action_type = args.get('action_type')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    
+    if target_user_id:
+        query = query.filter(UserLog.user_id == target_user_id)
+    
+    if action_type:
+        query = query.filter(UserLog.action_type == action_type)
+    
+    if start_date:
+        start = datetime.fromisoformat(start_date)
+        query = query.filter(UserLog.log_timestamp >= start)
+    
+    if end_date:
+        end = datetime.fromisoformat(end_date)
+        query = query.filter(UserLog.log_timestamp <= end)
+    
+    return query
+
 @bp.route('/', methods=['GET'])
 @jwt_required()
 def get_logs():
-    """Get user activity logs with optional filters"""
+    """
+    Get user activity logs with optional filters
+    
+    Pages newest first; pass the returned next_cursor as ?cursor= to get the next page.
+    """
     try:
         user_id = get_current_user_id()
         
         # Get query parameters
-        target_user_id = request.args.get('user_id', type=int)
-        action_type = request.args.get('action_type')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        limit = request.args.get('limit', 100, type=int)
-        
-        query = UserLog.query
-        
-        # Apply filters
-        if target_user_id:
-            query = query.filter_by(user_id=target_user_id)
-        
-        if action_type:
-            query = query.filter_by(action_type=action_type)
-        
-        if start_date:
-            start = datetime.fromisoformat(start_date)
-            query = query.filter(UserLog.log_timestamp >= start)
-        
-        if end_date:
-            end = datetime.fromisoformat(end_date)
-            query = query.filter(UserLog.log_timestamp <= end)
-        
-        # Order by most recent and limit
-        logs = query.order_by(UserLog.log_timestamp.desc()).limit(limit).all()
+        limit = clamp_page_size(request.args.get('limit', 100, type=int))
+        cursor = request.args.get('cursor')
+        
+        query = apply_log_filters(UserLog.query, request.args)
+        
+        # Order by most recent, resuming after the cursor
+        try:
+            # Versioned by the rows on this page only; coalescing bumps event_count in place
+            etag = etags.make_etag(etags.page_token(
+                page_query(query, UserLog.log_timestamp, UserLog.log_id, cursor, limit),
+                UserLog.log_id, UserLog.event_count
+            ))
+            if etags.is_fresh(etag):
+                return etags.not_modified(etag)
+            
+            logs, next_cursor = keyset_page(query, UserLog.log_timestamp, UserLog.log_id, cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return etags.tag(json_response({
+            'logs': [log.to_dict() for log in logs],
+            'next_cursor': next_cursor
+        }), etag), 200
         
-        return jsonify([log.to_dict() for log in logs]), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_logs():
+    """
+    Stream activity logs as CSV or NDJSON (?format=csv|ndjson)
+    
+    Accepts the same filters as get_logs. Rows are read through a server-side
+    cursor and written in chunks, so worker memory stays flat for any export size.
+    """
+    try:
+        user_id = get_current_user_id()
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        query = apply_log_filters(
+            db.session.query(*[col for _, col in EXPORT_COLUMNS]),
+            request.args
+        ).order_by(UserLog.log_timestamp.desc(), UserLog.log_id.desc())
+        
+        # Exports are always audited
+        logger.log_activity(
+            user_id=user_id,
+            session_id=request.headers.get('X-Session-Id'),
+            action_type='Export',
+            target_resource='logs',
+            request=request
+        )
+        
+        names = [name for name, _ in EXPORT_COLUMNS]
+        
+        def generate():
+            rows = query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            if export_format == 'csv':
+                writer.writerow(names)
+            
+            pending = 0
+            for row in rows:
+                values = [v.isoformat() if isinstance(v, datetime) else v for v in row]
+                if export_format == 'csv':
+                    writer.writerow(values)
+                else:
+                    buf.write(json.dumps(dict(zip(names, values)), ensure_ascii=False))
+                    buf.write('\n')
+                pending += 1
+                if pending >= EXPORT_BATCH_SIZE:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate(0)
+                    pending = 0
+            
+            if buf.tell():
+                yield buf.getvalue()
+        
+        if export_format == 'csv':
+            mimetype = 'text/csv'
+        else:
+            mimetype = 'application/x-ndjson'
+        filename = f"user_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -53,13 +172,19 @@ def get_logs():
 @bp.route('/sessions', methods=['GET'])
 @jwt_required()
 def get_sessions():
-    """Get user sessions"""
+    """
+    Get user sessions
+    
+    Pages newest first; pass the returned next_cursor as ?cursor= to get the next page.
+    """
     try:
         user_id = get_current_user_id()
         
         # Get query parameters
         target_user_id = request.args.get('user_id', type=int)
         active_only = request.args.get('active_only', 'false').lower() == 'true'
+        limit = clamp_page_size(request.args.get('limit', 100, type=int))
+        cursor = request.args.get('cursor')
         
         query = Session.query
         
@@ -67,11 +192,18 @@ def get_sessions():
             query = query.filter_by(user_id=target_user_id)
         
         if active_only:
-            query = query.filter_by(is_active=True)
+            # Sessions have no is_active column; an open session has no end_time
+            query = query.filter(Session.end_time.is_(None))
         
-        sessions = query.order_by(Session.start_time.desc()).all()
+        try:
+            sessions, next_cursor = keyset_page(query, Session.start_time, Session.session_id, cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify([session.to_dict() for session in sessions]), 200
+        return jsonify({
+            'sessions': [session.to_dict() for session in sessions],
+            'next_cursor': next_cursor
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -80,32 +212,34 @@ def get_sessions():
 @bp.route('/activity-summary', methods=['GET'])
 @jwt_required()
 def get_activity_summary():
-    """Get summary of user activities"""
+    """Get summary of user activities, served from hourly rollups"""
     try:
         user_id = request.args.get('user_id', type=int)
         days = request.args.get('days', 7, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
 
-        query = UserLog.query.filter(UserLog.log_timestamp >= start_date)
-
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-
-        logs = query.all()
+        # Hourly rollups plus a raw count of the edges of the range
+        rows = activity_counts(start_date, user_id=user_id)
         
-        # Aggregate by action type
+        # Fold the (hour, action) buckets into the breakdowns
+        total = 0
         summary = {}
-        for log in logs:
-            action = log.action_type
-            if action in summary:
-                summary[action] += 1
-            else:
-                summary[action] = 1
+        by_day = {}
+        by_hour = {}
+        for bucket_start, action, count in rows:
+            day_key = bucket_start.strftime('%Y-%m-%d')
+            hour_key = bucket_start.strftime('%Y-%m-%d %H:00')
+            total += count
+            summary[action] = summary.get(action, 0) + count
+            by_day[day_key] = by_day.get(day_key, 0) + count
+            by_hour[hour_key] = by_hour.get(hour_key, 0) + count
         
         return jsonify({
             'period_days': days,
-            'total_activities': len(logs),
-            'by_action_type': summary
+            'total_activities': total,
+            'by_action_type': summary,
+            'by_day': dict(sorted(by_day.items())),
+            'by_hour': dict(sorted(by_hour.items()))
         }), 200
         
     except Exception as e:
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
 from models import Order, User, InventoryItem
 from services.activity_logger import ActivityLogger
+from services.serializers import eager
+from services.responses import json_array_response
 from datetime import datetime
 
 bp = Blueprint('orders', __name__, url_prefix='/api/orders')
@@ -23,7 +25,7 @@ def get_orders():
         filter_user_id = request.args.get('user_id', type=int)
         item_id = request.args.get('item_id', type=int)
         
-        query = Order.query
+        query = eager(Order.query, Order)
         
         # Apply filters
         if filter_user_id:
@@ -35,6 +37,9 @@ def get_orders():
         # Order by most recent
         orders = query.order_by(Order.order_time.desc()).all()
         
+        # Serialize before logging: the log commit expires loaded rows
+        data = [order.to_dict() for order in orders]
+        
         # Log the view activity
         logger.log_activity(
             user_id=user_id,
@@ -44,7 +49,7 @@ def get_orders():
             request=request
         )
         
-        return jsonify([order.to_dict() for order in orders]), 200
+        return json_array_response(data), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -253,7 +258,10 @@ def get_user_orders(user_id):
     try:
         current_user_id = get_current_user_id()
         
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.order_time.desc()).all()
+        orders = eager(Order.query, Order).filter_by(user_id=user_id).order_by(Order.order_time.desc()).all()
+        
+        # Serialize before logging: the log commit expires loaded rows
+        data = [order.to_dict() for order in orders]
         
         # Log the view activity
         logger.log_activity(
@@ -264,7 +272,7 @@ def get_user_orders(user_id):
             request=request
         )
         
-        return jsonify([order.to_dict() for order in orders]), 200
+        return jsonify(data), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
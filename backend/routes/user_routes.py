@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db, bcrypt
 from models import User, Role
 from services.activity_logger import ActivityLogger
+from services.serializers import eager
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 logger = ActivityLogger()
@@ -18,7 +19,10 @@ def get_users():
     try:
         user_id = get_current_user_id()
         
-        users = User.query.all()
+        users = eager(User.query, User).all()
+        
+        # Serialize before logging: the log commit expires loaded rows
+        data = [user.to_dict() for user in users]
         
         # Log the view activity
         logger.log_activity(
@@ -29,7 +33,7 @@ def get_users():
             request=request
         )
         
-        return jsonify([user.to_dict() for user in users]), 200
+        return jsonify(data), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,154 @@
+"""Benchmark sql_guard.validate_and_fix over a corpus of generated queries.
+
+The corpus mixes SQL compiled from ask-sql questions (services/nl_sql.py),
+LLM-style statements with literal values (joins, subqueries, CTEs) and unsafe
+statements. Each is validated by the previous regex + sqlparse.format validator
+(kept below as the baseline), by the parsed validator with an empty cache, and
+by the parsed validator again with a warm cache. Statements only one of them
+accepts are listed at the end.
+
+Usage:
+    python scripts/bench_sql_guard.py --size 2000
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+
+import sqlparse
+
+from services.nl_sql import COLS, compile_question
+from services.sql_guard import validate_and_fix, validation_cache
+
+QUESTIONS = [
+    "last {n} logs", "logs by user {u}", "how many exports by user {u} today", "failed logins in the last {h} hours",
+    "top {k} users by failed logins this week", "logs per action type in the past {d} days", "most active ips",
+    "how many flagged events per day in the past {d} days", "sessions for user {u}", "logs from ip 10.0.{u}.{k}",
+    "number of logins per hour", "deletions by user {u} in the last {d} days", "logs {n} to {m}",
+]
+
+LLM_STYLE = [
+    "SELECT " + COLS + " FROM user_logs WHERE user_id = {u} AND action_type = 'Export' ORDER BY log_timestamp DESC LIMIT {k}",
+    "SELECT u.username, COUNT(*) AS exports FROM user_logs l JOIN users u ON u.user_id = l.user_id "
+    "WHERE l.action_type LIKE '%export%' AND l.log_timestamp >= NOW() - INTERVAL {d} DAY GROUP BY u.username "
+    "ORDER BY exports DESC LIMIT {k}",
+    "SELECT s.session_id, s.user_id, TIMESTAMPDIFF(MINUTE, s.start_time, s.end_time) AS minutes FROM sessions s "
+    "WHERE s.user_id IN (SELECT user_id FROM users WHERE role_id = {k}) ORDER BY minutes DESC LIMIT {n}",
+    "WITH daily AS (SELECT user_id, DATE(log_timestamp) AS day, COUNT(*) AS c FROM user_logs "
+    "WHERE log_timestamp >= '2025-10-{dd}' GROUP BY user_id, DATE(log_timestamp)) "
+    "SELECT d.user_id, u.username, MAX(d.c) AS peak FROM daily d LEFT JOIN users u ON u.user_id = d.user_id "
+    "GROUP BY d.user_id, u.username ORDER BY peak DESC LIMIT {k}",
+    "SELECT ip_address, COUNT(DISTINCT user_id) AS users FROM (SELECT ip_address, user_id FROM user_logs "
+    "WHERE is_flagged = 1 AND log_id > {n}) t GROUP BY ip_address HAVING users > 1 LIMIT {m}",
+    "SELECT * FROM user_logs WHERE log_id BETWEEN {n} AND {m}",
+]
+
+UNSAFE = [
+    "SELECT * FROM user_logs WHERE user_id = {u}; DROP TABLE users",
+    "DELETE FROM user_logs WHERE log_id < {n}",
+    "SELECT * FROM user_logs WHERE user_id IN (SELECT user_id FROM roles WHERE role_id = {k}) LIMIT {k}",
+    "SELECT password_hash FROM users WHERE user_id = {u} FOR UPDATE",
+    "SELECT table_name FROM information_schema.tables LIMIT {k}",
+    "SELECT SLEEP({k}) FROM users LIMIT 1",
+    "WITH secrets AS (SELECT * FROM secrets WHERE id > {k}) SELECT * FROM secrets LIMIT {n}",
+]
+
+
+def regex_validate(sql):
+    """The validator sql_guard used before parsing into a token tree"""
+    s = sql.strip().strip(";")
+    if not s.lower().startswith("select"):
+        raise ValueError("Only SELECT allowed")
+    if re.search(r";\s*\S", s):
+        raise ValueError("Multiple statements not allowed")
+    if re.search(r"\b(insert|update|delete|drop|alter|create|grant|revoke|truncate)\b", s, re.I):
+        raise ValueError("Write keywords not allowed")
+    if "limit" not in s.lower():
+        s += " LIMIT 200"
+    for a, b in re.findall(r"\bfrom\s+([`a-zA-Z0-9_\.]+)|\bjoin\s+([`a-zA-Z0-9_\.]+)", s, re.I):
+        t = (a or b).split(".")[-1].strip("`")
+        if t not in {"user_logs", "sessions", "users"}:
+            raise ValueError(f"Table {t} not allowed")
+    return sqlparse.format(s, reindent=True, keyword_case="upper")
+
+
+def build_corpus(size, seed):
+    rng = random.Random(seed)
+    corpus = set()
+    while len(corpus) < size:
+        values = {
+            "n": rng.randint(1, 5000), "u": rng.randint(1, 200), "k": rng.randint(1, 50),
+            "h": rng.randint(1, 72), "d": rng.randint(1, 30), "dd": f"{rng.randint(1, 28):02d}",
+        }
+        values["m"] = values["n"] + rng.randint(1, 150)
+        pick = rng.random()
+        if pick < 0.5:
+            compiled = compile_question(rng.choice(QUESTIONS).format(**values))
+            if compiled:
+                # Inline the bound values so statements are distinct, as LLM output would be
+                sql, params = compiled
+                for name, value in sorted(params.items(), key=lambda p: -len(p[0])):
+                    sql = sql.replace(f":{name}", repr(value) if isinstance(value, str) else f"'{value}'")
+                corpus.add(sql)
+        elif pick < 0.9:
+            corpus.add(rng.choice(LLM_STYLE).format(**values))
+        else:
+            corpus.add(rng.choice(UNSAFE).format(**values))
+    return sorted(corpus)
+
+
+def run(validator, corpus):
+    timings, accepted = [], set()
+    for sql in corpus:
+        start = time.perf_counter()
+        try:
+            validator(sql)
+            accepted.add(sql)
+        except ValueError:
+            pass
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings, accepted
+
+
+def report(label, timings, accepted, total):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean {statistics.mean(timings):8.1f} us   p95 {p95:8.1f} us   "
+          f"accepted {len(accepted)}/{total}")
+
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--size', type=int, default=2000, help='number of distinct statements')
+parser.add_argument('--seed', type=int, default=7)
+args = parser.parse_args()
+
+corpus = build_corpus(args.size, args.seed)
+print(f"{len(corpus)} statements, mean length {statistics.mean(len(s) for s in corpus):.0f} chars")
+
+base_timings, base_accepted = run(regex_validate, corpus)
+report("regex + format", base_timings, base_accepted, len(corpus))
+
+validation_cache.clear()
+validation_cache.maxsize = max(validation_cache.maxsize, len(corpus))
+cold_timings, cold_accepted = run(validate_and_fix, corpus)
+report("parsed (cold cache)", cold_timings, cold_accepted, len(corpus))
+
+warm_timings, warm_accepted = run(validate_and_fix, corpus)
+report("parsed (warm cache)", warm_timings, warm_accepted, len(corpus))
+
+stricter = sorted(base_accepted - cold_accepted)
+print(f"\nRejected only by the parsed validator: {len(stricter)}")
+for sql in stricter[:3]:
+    print(f"  {sql[:110]}")
+
+# Statements the old validator rejected by mistake (CTEs, keywords inside string literals)
+looser = {}
+for sql in sorted(cold_accepted - base_accepted):
+    try:
+        regex_validate(sql)
+    except ValueError as e:
+        looser.setdefault(str(e), []).append(sql)
+print(f"Accepted only by the parsed validator: {sum(len(v) for v in looser.values())}")
+for reason, sqls in looser.items():
+    print(f"  {len(sqls)} rejected by the regex validator as '{reason}', e.g. {sqls[0][-90:]}")
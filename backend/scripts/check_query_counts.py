@@ -0,0 +1,51 @@
+"""Check that list endpoints run a bounded number of SQL queries.
+
+Each endpoint is called once to warm caches and rollups, then again under
+assert_max_queries. The bounds do not depend on row counts, so an N+1 lazy
+load introduced in a to_dict() shows up as a failure on any non-trivial DB.
+
+Usage:
+    python scripts/check_query_counts.py
+"""
+import sys
+
+from flask_jwt_extended import create_access_token
+
+from app import app
+from models import User
+from services.serializers import assert_max_queries
+
+# endpoint -> max queries (activity logging on inventory/orders/users adds a write)
+ENDPOINT_BOUNDS = {
+    '/api/analytics/anomaly-scores': 2,
+    '/api/analytics/flagged-activities': 2,
+    '/api/analytics/top-anomalies': 3,
+    '/api/analytics/rule-based-detections': 2,
+    '/api/analytics/dashboard-stats': 14,
+    '/api/logs/': 2,
+    '/api/logs/sessions': 2,
+    '/api/orders/': 6,
+    '/api/users/': 6,
+    '/api/inventory/': 6,
+}
+
+with app.app_context():
+    user = User.query.first()
+    if not user:
+        sys.exit('No users in database')
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.user_id))}'}
+    client = app.test_client()
+    app.config['DASHBOARD_CACHE_TTL_SECONDS'] = 0
+
+    failures = 0
+    for url, limit in ENDPOINT_BOUNDS.items():
+        client.get(url, headers=headers)
+        try:
+            with assert_max_queries(limit, label=url) as counter:
+                response = client.get(url, headers=headers)
+            print(f"OK   {url}: {counter['count']} queries (max {limit}), status {response.status_code}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {e}")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,49 @@
+"""One-off migration: fill structured detector fields on legacy anomaly_scores rows.
+
+Rows seeded before per_feature_stats/causes_detail/findings/std_pct/deviation_pct
+were persisted (or carrying the old "Auto-generated risk" text) are enriched from
+a single baseline detector run, preferring the highest-scoring result per user.
+
+Usage:
+    python scripts/enrich_anomaly_scores.py
+"""
+from app import app
+from extensions import db
+from models import AnomalyScore
+from services.detection import compute_anomaly_scores
+
+ENRICHED_FIELDS = ('per_feature_stats', 'causes_detail', 'std_pct', 'deviation_pct', 'findings', 'explanation')
+
+with app.app_context():
+    legacy = AnomalyScore.query.filter(db.or_(
+        AnomalyScore.per_feature_stats.is_(None),
+        AnomalyScore.explanation.is_(None),
+        AnomalyScore.explanation.like('%Auto-generated risk%')
+    )).all()
+    print('Legacy rows:', len(legacy))
+
+    if legacy:
+        enriched = compute_anomaly_scores(days=30, obs_hours=24)
+
+        # Build map user_id -> highest-scoring enriched record
+        enrich_map = {}
+        for e in enriched:
+            uid = e.get('user_id')
+            if uid is None:
+                continue
+            existing = enrich_map.get(uid)
+            if not existing or int(e.get('risk_score', 0)) > int(existing.get('risk_score', 0)):
+                enrich_map[uid] = e
+
+        updated = 0
+        for row in legacy:
+            em = enrich_map.get(row.user_id)
+            if not em:
+                continue
+            for key in ENRICHED_FIELDS:
+                if em.get(key) is not None:
+                    setattr(row, key, em.get(key))
+            updated += 1
+
+        db.session.commit()
+        print('Enriched rows:', updated)
@@ -0,0 +1,20 @@
+"""Rebuild the per-user daily risk series from anomaly scores, rule-based detections and flags.
+
+Normally the series is maintained as detections are saved; run this once after
+creating the user_risk_daily table, or to repair a range of days (both optional):
+    python scripts/rebuild_risk_series.py --start 2025-10-01 --end 2025-10-08
+"""
+import argparse
+from datetime import date
+
+from app import app
+from services.risk_series import rebuild_risk_series
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--start', type=date.fromisoformat, help='first day to rebuild (inclusive)')
+parser.add_argument('--end', type=date.fromisoformat, help='last day to rebuild (inclusive)')
+args = parser.parse_args()
+
+with app.app_context():
+    written = rebuild_risk_series(args.start, args.end)
+    print(f"Wrote {written} daily rows for {args.start or 'beginning'} to {args.end or 'today'}")
@@ -0,0 +1,26 @@
+"""Fold new logs, anomaly scores and flags into the hourly rollup tables.
+
+Run periodically (e.g. every minute from cron) to keep dashboard reads cheap:
+    python scripts/refresh_rollups.py
+
+Rebuild a time range from raw data (ISO timestamps, both optional):
+    python scripts/refresh_rollups.py --rebuild --start 2025-10-01 --end 2025-10-08
+"""
+import argparse
+from datetime import datetime
+
+from app import app
+from services.rollups import refresh_rollups, rebuild_rollups
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--rebuild', action='store_true', help='recompute rollups for a range instead of refreshing')
+parser.add_argument('--start', type=datetime.fromisoformat, help='rebuild range start (inclusive)')
+parser.add_argument('--end', type=datetime.fromisoformat, help='rebuild range end (exclusive)')
+args = parser.parse_args()
+
+with app.app_context():
+    marks = refresh_rollups()
+    print('Watermarks:', marks)
+    if args.rebuild:
+        rebuild_rollups(args.start, args.end)
+        print(f"Rebuilt rollups for {args.start or 'beginning'} to {args.end or 'now'}")
@@ -2,6 +2,7 @@ from app import app
 from services.rule_detection import RuleBasedDetection
 from extensions import db
 from models import RuleBasedDetection as RModel
+from services import risk_series
 
 with app.app_context():
     detector = RuleBasedDetection()
@@ -23,6 +24,7 @@ with app.app_context():
             detected_at=d['detected_at']
         )
         db.session.add(rec)
+        risk_series.record_detection(d['user_id'], d['detected_at'], d['risk_score'])
         saved += 1
     db.session.commit()
     print('Saved to DB:', saved)
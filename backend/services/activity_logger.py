@@ -1,11 +1,44 @@
+from flask import current_app
 from extensions import db
 from models import UserLog
+from services import risk_series, event_stream
 from datetime import datetime
+import random
+import threading
+import time
+
+# Actions that are always written as their own row (never coalesced or shed)
+PROTECTED_ACTIONS = {'login', 'logout', 'loginfail', 'login_fail', 'failed_login', 'login_failed',
+                     'auth_fail', 'delete', 'export', 'bulk_export', 'download'}
+
+# Low-value actions that may be coalesced and, under load, sampled
+COALESCIBLE_ACTIONS = {'view'}
+
+# State shared by every ActivityLogger instance in this process (each blueprint owns one)
+_state_lock = threading.Lock()
+_recent_events = {}  # (user_id, session_id, action_type, target_resource) -> (log_id, first_seen)
+_inflight_writes = 0
+_stats = {'written': 0, 'coalesced': 0, 'shed': 0}
+_MAX_TRACKED_KEYS = 10000
+
+
+def get_logger_stats():
+    """Return counters for written, coalesced and shed events plus current in-flight writes"""
+    with _state_lock:
+        return dict(_stats, inflight=_inflight_writes, tracked_keys=len(_recent_events))
+
 
 class ActivityLogger:
     """
     Service to log user activities and send to detection engine
     This captures all user actions for security analytics
+    
+    High-volume View events are controlled in two stages:
+    - Coalescing: identical (user, session, action, resource) events within
+      ACTIVITY_LOG_COALESCE_SECONDS increment event_count on one row
+    - Load shedding: while ACTIVITY_LOG_MAX_INFLIGHT writes are in progress,
+      only ACTIVITY_LOG_SHED_SAMPLE_RATE of low-value events are kept
+    Auth, delete and export events are never coalesced or dropped.
     """
     
     def log_activity(self, user_id, session_id, action_type, target_resource, request):
@@ -20,9 +53,22 @@ class ActivityLogger:
             request: Flask request object to extract IP and user agent
         
         Returns:
-            Created log entry
+            Created log entry, or None if the event was coalesced, shed or failed
         """
+        global _inflight_writes
+        
+        low_value = self._is_low_value(action_type, target_resource)
+        if low_value and self._should_shed():
+            with _state_lock:
+                _stats['shed'] += 1
+            return None
+        
+        with _state_lock:
+            _inflight_writes += 1
         try:
+            if low_value and self._coalesce(user_id, session_id, action_type, target_resource):
+                return None
+            
             # Extract request information
             ip_address = request.remote_addr or request.environ.get('HTTP_X_FORWARDED_FOR', 'unknown')
             user_agent = request.headers.get('User-Agent', 'unknown')[:255]  # Truncate to match DB schema
@@ -44,6 +90,11 @@ class ActivityLogger:
             db.session.add(log_entry)
             db.session.commit()
             
+            with _state_lock:
+                _stats['written'] += 1
+                if low_value:
+                    self._remember(user_id, session_id, action_type, target_resource, log_entry.log_id)
+            
             # Here you can add logic to send to detection engine
             # For example: send to a queue, webhook, or ML model
             self._send_to_detection_engine(log_entry)
@@ -54,6 +105,74 @@ class ActivityLogger:
             print(f"Error logging activity: {str(e)}")
             db.session.rollback()
             return None
+        finally:
+            with _state_lock:
+                _inflight_writes -= 1
+    
+    def _is_low_value(self, action_type, target_resource):
+        """Only plain views of non-auth resources may be coalesced or shed"""
+        action = (action_type or '').lower()
+        if action in PROTECTED_ACTIONS or (target_resource or '').startswith('auth'):
+            return False
+        return action in COALESCIBLE_ACTIONS
+    
+    def _should_shed(self):
+        """Sample low-value events while the write path is saturated"""
+        max_inflight = current_app.config.get('ACTIVITY_LOG_MAX_INFLIGHT', 16)
+        with _state_lock:
+            saturated = max_inflight > 0 and _inflight_writes >= max_inflight
+        if not saturated:
+            return False
+        return random.random() >= current_app.config.get('ACTIVITY_LOG_SHED_SAMPLE_RATE', 0.1)
+    
+    def _coalesce(self, user_id, session_id, action_type, target_resource):
+        """
+        Fold a repeated event into the row written for the same key within the window
+        
+        Returns:
+            True if an existing row was updated, False if a new row must be written
+        """
+        window = current_app.config.get('ACTIVITY_LOG_COALESCE_SECONDS', 30)
+        if window <= 0:
+            return False
+        
+        key = (user_id, session_id, action_type, target_resource)
+        with _state_lock:
+            recent = _recent_events.get(key)
+        if not recent or time.monotonic() - recent[1] > window:
+            return False
+        
+        try:
+            updated = UserLog.query.filter_by(log_id=recent[0]).update(
+                {UserLog.event_count: db.func.coalesce(UserLog.event_count, 1) + 1},
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            print(f"Error coalescing activity: {str(e)}")
+            db.session.rollback()
+            return False
+        
+        if not updated:
+            # Row is gone (e.g. purged); fall back to writing a new one
+            with _state_lock:
+                _recent_events.pop(key, None)
+            return False
+        
+        with _state_lock:
+            _stats['coalesced'] += 1
+        return True
+    
+    def _remember(self, user_id, session_id, action_type, target_resource, log_id):
+        """Track the row new repeats of this key should be folded into (caller holds _state_lock)"""
+        if len(_recent_events) >= _MAX_TRACKED_KEYS:
+            window = current_app.config.get('ACTIVITY_LOG_COALESCE_SECONDS', 30)
+            cutoff = time.monotonic() - window
+            for k in [k for k, v in _recent_events.items() if v[1] < cutoff]:
+                del _recent_events[k]
+            if len(_recent_events) >= _MAX_TRACKED_KEYS:
+                _recent_events.clear()
+        _recent_events[(user_id, session_id, action_type, target_resource)] = (log_id, time.monotonic())
     
     def _send_to_detection_engine(self, log_entry):
         """
@@ -139,7 +258,9 @@ class ActivityLogger:
                     flagged_at=datetime.utcnow()
                 )
                 db.session.add(flag)
+                risk_series.record_flags(log_entry.user_id, flag.flagged_at)
                 db.session.commit()
+                event_stream.notify()
             except Exception as e:
                 print(f"Error flagging activity: {str(e)}")
                 db.session.rollback()
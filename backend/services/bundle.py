@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, url_for
+
+from services import metrics
+
+# Read-only GET endpoints that can be requested as bundle sections
+BUNDLE_SECTIONS = {
+    'dashboard_stats': 'analytics.get_dashboard_stats',
+    'anomaly_scores': 'analytics.get_anomaly_scores',
+    'top_anomalies': 'analytics.get_top_anomalies',
+    'rule_based_detections': 'analytics.get_rule_based_detections',
+    'flagged_activities': 'analytics.get_flagged_activities',
+    'user_risk_profile': 'analytics.get_user_risk_profile',
+    'user_risk_series': 'analytics.get_user_risk_series',
+    'activity_summary': 'logs.get_activity_summary',
+}
+MAX_SECTIONS = 10
+
+
+def _run_section(app, auth, session_id, endpoint, path):
+    """Call endpoint's view for path without re-verifying the JWT; returns (status, data, seconds)"""
+    start = time.perf_counter()
+    headers = {'X-Session-Id': session_id} if session_id else {}
+    # Inline this reuses the caller's app context (and DB session); on a worker
+    # thread it gets its own app context and a pooled connection
+    with app.test_request_context(path, headers=headers) as ctx:
+        for name, value in auth.items():
+            setattr(g, name, value)
+        view = app.view_functions[endpoint]
+        try:
+            response = app.make_response(getattr(view, '__wrapped__', view)(**ctx.request.view_args))
+            status, data = response.status_code, response.get_json(silent=True)
+        except Exception as e:
+            status, data = 500, {'error': str(e)}
+    return status, data, time.perf_counter() - start
+
+
+def run_bundle(sections, session_id=None):
+    """
+    Run bundle sections, concurrently when BUNDLE_MAX_WORKERS allows
+
+    Args:
+        sections: List of (key, name, params) with name in BUNDLE_SECTIONS
+        session_id: X-Session-Id forwarded to the sections
+
+    Returns:
+        Dict of key -> {'status', 'data', 'ms'}
+    """
+    app = current_app._get_current_object()
+    # Decoded JWT left on g by @jwt_required on the bundle route, shared by every section
+    auth = {name: value for name, value in vars(g).items() if name.startswith('_jwt_extended_')}
+
+    jobs = []
+    results = {}
+    for key, name, params in sections:
+        endpoint = BUNDLE_SECTIONS[name]
+        try:
+            path = url_for(endpoint, **params)
+        except Exception as e:
+            results[key] = {'status': 400, 'data': {'error': f'Invalid params: {e}'}, 'ms': 0.0}
+            continue
+        jobs.append((key, name, endpoint, path))
+
+    workers = min(current_app.config.get('BUNDLE_MAX_WORKERS', 4), len(jobs))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(key, name, pool.submit(_run_section, app, auth, session_id, endpoint, path))
+                       for key, name, endpoint, path in jobs]
+            outcomes = [(key, name, future.result()) for key, name, future in futures]
+    else:
+        outcomes = [(key, name, _run_section(app, auth, session_id, endpoint, path))
+                    for key, name, endpoint, path in jobs]
+
+    for key, name, (status, data, seconds) in outcomes:
+        metrics.observe(f'bundle.{name}', seconds)
+        results[key] = {'status': status, 'data': data, 'ms': round(1000.0 * seconds, 2)}
+    return results
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+from services import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry expiry and LRU eviction
+
+    Args:
+        name: Metrics prefix (hits/misses are counted as <name>.hits / <name>.misses)
+        ttl: Seconds an entry stays valid
+        maxsize: Maximum number of entries kept; least recently used are evicted first
+        maxbytes: Optional bound on the summed size of entries (sizes are passed to set())
+    """
+
+    def __init__(self, name, ttl, maxsize=128, maxbytes=None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                hit = True
+            else:
+                if entry is not _MISSING:
+                    del self._data[key]
+                    self.nbytes -= entry[2]
+                hit = False
+        metrics.incr(f'{self.name}.hits' if hit else f'{self.name}.misses')
+        return entry[1] if hit else default
+
+    def set(self, key, value, ttl=None, size=0):
+        """
+        Store value under key, evicting the least recently used entries if full
+
+        Returns:
+            False if the value alone is larger than maxbytes and was not stored
+        """
+        if self.maxbytes is not None and size > self.maxbytes:
+            metrics.incr(f'{self.name}.too_large')
+            return False
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            self._data[key] = (expires_at, value, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted[2]
+        return True
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,119 @@
+import os
+import re
+
+from services import metrics
+from services.llm_client import LLM_NUM_CTX
+
+# Prompt budget: the model's context minus room for the reply
+CHAT_REPLY_TOKENS   = int(os.getenv("CHAT_REPLY_TOKENS", "512"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "160"))  # cap for the digest of dropped turns
+PROMPT_BUDGET       = LLM_NUM_CTX - CHAT_REPLY_TOKENS
+
+MESSAGE_OVERHEAD = 4  # role and separators in the chat template
+ROLES = {"system", "user", "assistant"}
+
+
+def estimate_tokens(text):
+    """Rough token count for English text and SQL (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _cost(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def _truncate(message, tokens):
+    """Message cut to about tokens, keeping its start and end"""
+    chars = max(tokens - MESSAGE_OVERHEAD, 1) * 4
+    content = message["content"]
+    if len(content) <= chars:
+        return message
+    half = chars // 2
+    return {**message, "content": content[:half] + " … " + content[-half:]}
+
+
+def _gist(text, limit=120):
+    first = re.split(r"(?<=[.?!])\s|\n", text.strip(), maxsplit=1)[0]
+    return first if len(first) <= limit else first[:limit - 1] + "…"
+
+
+def summarize(dropped, tokens=CHAT_SUMMARY_TOKENS):
+    """
+    Short system note standing in for dropped turns
+
+    Lists the gist of the user's earlier messages, newest first until tokens run out,
+    so the model keeps the thread of the conversation without an extra LLM call.
+    """
+    header = "Earlier in this conversation (older turns omitted), the user asked about: "
+    room = tokens * 4 - len(header)
+    items = []
+    for message in reversed(dropped):
+        if message["role"] != "user":
+            continue
+        gist = _gist(message["content"])
+        if len(gist) + 2 > room:
+            break
+        items.append(gist)
+        room -= len(gist) + 2
+    if not items:
+        return None
+    return {"role": "system", "content": header + "; ".join(reversed(items)) + "."}
+
+
+def compact(messages, budget=None):
+    """
+    Fit a chat request into the prompt budget
+
+    Leading system messages and the latest message are always kept. Earlier turns
+    are kept newest first while they fit; the rest are dropped and summarized in
+    one short system note. The prompt therefore stays bounded however long the
+    conversation grows.
+
+    Args:
+        messages: [{role, content}] as sent by the client (malformed entries are skipped)
+        budget: Prompt tokens available (defaults to PROMPT_BUDGET)
+
+    Returns:
+        The messages to send
+    """
+    budget = budget or PROMPT_BUDGET
+    messages = [
+        {"role": m["role"], "content": m["content"]} for m in messages
+        if isinstance(m, dict) and m.get("role") in ROLES and isinstance(m.get("content"), str)
+    ]
+
+    pinned = []
+    while messages and messages[0]["role"] == "system":
+        pinned.append(messages.pop(0))
+    if not messages:
+        return pinned
+
+    *older, latest = messages
+    used = sum(_cost(m) for m in pinned)
+    latest = _truncate(latest, max(budget - used, MESSAGE_OVERHEAD + 1))
+    used += _cost(latest)
+
+    if used + sum(_cost(m) for m in older) <= budget:
+        metrics.set_gauge("chat.prompt_tokens", used + sum(_cost(m) for m in older))
+        return pinned + older + [latest]
+
+    room = budget - used - CHAT_SUMMARY_TOKENS - MESSAGE_OVERHEAD
+    kept = []
+    for message in reversed(older):
+        cost = _cost(message)
+        if cost > room:
+            break
+        kept.append(message)
+        room -= cost
+    kept.reverse()
+    # Do not open the kept history with an answer whose question was dropped
+    while kept and kept[0]["role"] == "assistant":
+        kept.pop(0)
+
+    dropped = older[:len(older) - len(kept)]
+    summary = summarize(dropped)
+    result = pinned + ([summary] if summary else []) + kept + [latest]
+
+    metrics.incr("chat.turns_dropped", len(dropped))
+    metrics.set_gauge("chat.prompt_tokens", sum(_cost(m) for m in result))
+    return result
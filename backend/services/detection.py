@@ -1,9 +1,14 @@
 from datetime import datetime, timedelta
 from collections import defaultdict
 import math
+import threading
+import time
 
+from flask import current_app
 from extensions import db
+from services import metrics
 from models import UserLog, User, Role, AnomalyScore, FlaggedActivity, RuleBasedDetection
+from services import risk_series, event_stream
 
 
 def compute_features(logs):
@@ -294,6 +299,7 @@ def compute_anomaly_scores(days=30, obs_hours=24):
         findings_details = []
         causes_list = []
         per_feature_stats = {}
+        daily_samples = per_user_daily.get(u.user_id, [])
         for key, cfg in FEATURE_CONFIG.items():
             # collect mean/std for the feature for this user
             user_mean, user_std = stats_from_samples(daily_samples, key)
@@ -315,6 +321,11 @@ def compute_anomaly_scores(days=30, obs_hours=24):
             f"Findings: {findings_summary}"
         )
 
+        # per-feature z-values summary
+        std_devs_map = {k: round(float(fz_user.get(k, 0.0)), 2) for k in FEATURE_CONFIG.keys()}
+        max_z = max(std_devs_map.values()) if std_devs_map else 0.0
+        std_pct = int(min(100, 100.0 * (max_z / MAX_Z_CAP))) if MAX_Z_CAP else 0
+
         # Persist as AnomalyScore (baseline detection should remain separate from rule-based detections)
         try:
             triggered_rules = ', '.join([f"{f.get('name')} [{f.get('code')} ]" for f in findings]) if findings else ''
@@ -325,16 +336,24 @@ def compute_anomaly_scores(days=30, obs_hours=24):
                 as_rec = recent_as
                 # refresh timestamp
                 as_rec.created_at = datetime.utcnow()
-                db.session.add(as_rec)
-                db.session.flush()
             else:
                 as_rec = AnomalyScore(user_id=u.user_id, session_id=session_id, risk_score=int(score), risk_level=level, explanation=explanation)
-                db.session.add(as_rec)
-                db.session.flush()
+                # Only new rows count towards the daily series; refreshed duplicates were counted already
+                risk_series.record_detection(u.user_id, datetime.utcnow(), int(score))
+
+            # Store structured output with the row so reads never need to recompute it
+            as_rec.per_feature_stats = per_feature_stats
+            as_rec.causes_detail = causes_list
+            as_rec.findings = findings
+            as_rec.std_pct = std_pct
+            as_rec.deviation_pct = int(pct)
+            db.session.add(as_rec)
+            db.session.flush()
 
             # Flag underlying logs if very high
             if score >= 90 and obs_f.get('total_actions',0) > 0:
                 recent_logs = UserLog.query.filter(UserLog.user_id==u.user_id, UserLog.log_timestamp>=obs_start).all()
+                flagged = 0
                 for rl in recent_logs:
                     try:
                         rl.is_flagged = True
@@ -344,16 +363,14 @@ def compute_anomaly_scores(days=30, obs_hours=24):
                     try:
                         flag = FlaggedActivity(log_id=rl.log_id, reason='High baseline anomaly', severity='High')
                         db.session.add(flag)
+                        flagged += 1
                     except Exception:
                         # If the flagged_activity view/table schema doesn't match our model (seed SQL may define a view), skip creating flags
                         pass
+                # One series upsert for this user's flags today, not one per log
+                risk_series.record_flags(u.user_id, datetime.utcnow(), count=flagged)
 
             # append structured result for API consumption (AnomalyScore shape + extra fields)
-            # compute per-feature z-values summary
-            std_devs_map = {k: round(float(fz_user.get(k, 0.0)), 2) for k in FEATURE_CONFIG.keys()}
-            max_z = max(std_devs_map.values()) if std_devs_map else 0.0
-            std_pct = int(min(100, 100.0 * (max_z / MAX_Z_CAP))) if MAX_Z_CAP else 0
-
             out_records.append({
                 'detection_id': None,
                 'score_id': as_rec.score_id,
@@ -383,8 +400,69 @@ def compute_anomaly_scores(days=30, obs_hours=24):
 
     try:
         db.session.commit()
+        event_stream.notify()
     except Exception as e:
         db.session.rollback()
         print('Error committing anomaly scores:', e)
 
     return out_records
+
+
+# Single-flight result cache for compute_anomaly_scores (per worker process)
+_cache_lock = threading.Lock()
+_cached_results = {}  # (days, obs_hours) -> (max_log_id, computed_at, results)
+_inflight = {}  # (days, obs_hours, max_log_id) -> _Flight
+
+
+class _Flight:
+    """One in-progress computation that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+def cached_compute_anomaly_scores(days=30, obs_hours=24, ttl=None):
+    """Return compute_anomaly_scores results, reusing them until new logs arrive or ttl expires.
+
+    Concurrent callers with the same key wait on the single in-flight computation
+    instead of each running the detector.
+    """
+    if ttl is None:
+        ttl = current_app.config.get('ANOMALY_CACHE_TTL_SECONDS', 300)
+    max_log_id = db.session.query(db.func.max(UserLog.log_id)).scalar() or 0
+    slot = (days, obs_hours)
+    key = (days, obs_hours, max_log_id)
+
+    with _cache_lock:
+        cached = _cached_results.get(slot)
+        if cached and cached[0] == max_log_id and time.monotonic() - cached[1] < ttl:
+            metrics.incr('anomaly_cache.hits')
+            return cached[2]
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+
+    if not leader:
+        metrics.incr('anomaly_cache.waits')
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.results
+
+    metrics.incr('anomaly_cache.misses')
+    try:
+        with metrics.timed('anomaly_cache.compute'):
+            flight.results = compute_anomaly_scores(days=days, obs_hours=obs_hours)
+        with _cache_lock:
+            _cached_results[slot] = (max_log_id, time.monotonic(), flight.results)
+        return flight.results
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
@@ -0,0 +1,59 @@
+import hashlib
+
+from flask import request, Response
+
+from extensions import db
+from services import metrics
+
+
+def version_token(query, *aggregates):
+    """
+    Cheap version of the rows a list endpoint would return
+
+    Runs one aggregate SELECT over the already-filtered query: count(*) plus the
+    given aggregates (typically max(id), and max(updated column) for rows that
+    are refreshed in place). Pass the query before loader options are attached.
+
+    Returns:
+        Tuple of aggregate values
+    """
+    return tuple(query.order_by(None).with_entities(db.func.count(), *aggregates).one())
+
+
+def page_token(page_query, *columns):
+    """
+    Version of one page of a list endpoint
+
+    Reads only the given columns (the id, plus any column updated in place) of the
+    rows the page will serve, so the cost is bounded by the page size rather than
+    the filtered range. Pass the query with its ORDER BY and LIMIT applied.
+
+    Returns:
+        Tuple of column tuples, one per row on the page
+    """
+    return tuple(tuple(row) for row in page_query.with_entities(*columns).all())
+
+
+def make_etag(*versions):
+    """ETag for the current request URL (path and filters) at the given version tokens"""
+    raw = repr((request.full_path, versions))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag):
+    """True if the client's If-None-Match already holds etag"""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    """Empty 304 response for a client that already has the current version"""
+    metrics.incr('etag.not_modified')
+    response = Response(status=304)
+    return tag(response, etag)
+
+
+def tag(response, etag):
+    """Attach etag to a response; clients must revalidate before reusing it"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
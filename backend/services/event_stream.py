@@ -0,0 +1,96 @@
+import threading
+
+from extensions import db
+from models import RuleBasedDetection, AnomalyScore, FlaggedActivity
+from services.serializers import eager
+
+# Event sources in the order they are emitted each round: (event name, model, id column, severity column)
+SOURCES = (
+    ('rule_detection', RuleBasedDetection, RuleBasedDetection.detection_id, RuleBasedDetection.risk_level),
+    ('anomaly_score', AnomalyScore, AnomalyScore.score_id, AnomalyScore.risk_level),
+    ('flag', FlaggedActivity, FlaggedActivity.flag_id, FlaggedActivity.severity),
+)
+
+# Bumped whenever this process commits detections or flags so open streams wake
+# immediately; streams in other worker processes pick changes up on their poll interval.
+_cond = threading.Condition()
+_version = 0
+
+
+def notify():
+    """Wake every stream in this process; call after committing detections or flags"""
+    global _version
+    with _cond:
+        _version += 1
+        _cond.notify_all()
+
+
+def current_version():
+    with _cond:
+        return _version
+
+
+def wait_for_change(version, timeout):
+    """Block until notify() is called after version was read, or timeout seconds pass"""
+    with _cond:
+        _cond.wait_for(lambda: _version != version, timeout=timeout)
+
+
+def encode_event_id(marks):
+    """Event ids carry the last id delivered from each source, e.g. '12-40-7'"""
+    return '-'.join(str(m) for m in marks)
+
+
+def decode_event_id(value):
+    """
+    Parse a Last-Event-ID back into per-source marks
+
+    Raises:
+        ValueError: if the id was not produced by encode_event_id
+    """
+    try:
+        marks = [int(part) for part in value.split('-')]
+    except (AttributeError, ValueError):
+        raise ValueError('Invalid Last-Event-ID')
+    if len(marks) != len(SOURCES) or any(m < 0 for m in marks):
+        raise ValueError('Invalid Last-Event-ID')
+    return marks
+
+
+def latest_marks():
+    """Current max id of each source, so a fresh stream only sees new events"""
+    return [db.session.query(db.func.coalesce(db.func.max(id_col), 0)).scalar() for _, _, id_col, _ in SOURCES]
+
+
+def fetch_events(marks, severities=None, limit=200):
+    """
+    Rows persisted after marks, oldest first per source
+
+    Args:
+        marks: Last delivered id per source (see SOURCES)
+        severities: Optional set of lower-case severities to keep; 'high' also
+            matches rule detections' 'High Alert' risk level
+        limit: Max rows read per source in one round
+
+    Returns:
+        (events, marks) - events is a list of (event name, row, event id); marks
+        also advances past rows skipped by the severity filter
+    """
+    marks = list(marks)
+    events = []
+    if severities:
+        severities = set(severities) | {f'{s} alert' for s in severities}
+    for i, (name, model, id_col, severity_col) in enumerate(SOURCES):
+        upper = db.session.query(db.func.max(id_col)).scalar() or 0
+        if upper <= marks[i]:
+            continue
+        query = eager(model.query, model).filter(id_col > marks[i], id_col <= upper)
+        if severities:
+            query = query.filter(db.func.lower(severity_col).in_(severities))
+        rows = query.order_by(id_col.asc()).limit(limit).all()
+        for row in rows:
+            marks[i] = getattr(row, id_col.key)
+            events.append((name, row, encode_event_id(marks)))
+        if len(rows) < limit:
+            marks[i] = upper
+    return events, marks
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics
+from services.cache import TTLCache
+from services.llm_client import chat_stream as llm_chat_stream
+from services.responses import dumps
+
+EXPLAIN_SYSTEM = (
+    "You are a security analyst. Using ONLY the information provided, write one short paragraph "
+    "(max 120 words) explaining what the SQL result shows and any notable signals. "
+    "Be cautious—do not invent facts. If there are zero rows, say so. Keep it concise and useful to an admin."
+)
+
+EXPLAIN_WORKERS = int(os.getenv("EXPLAIN_WORKERS", "2"))
+EXPLAIN_CACHE_TTL = int(os.getenv("EXPLAIN_CACHE_TTL", "3600"))
+EXPLAIN_ERROR_TTL = 60  # failed explanations are retried after this
+
+_executor = ThreadPoolExecutor(max_workers=EXPLAIN_WORKERS, thread_name_prefix="explain")
+_lock = threading.Lock()
+_running = {}  # handle -> Explanation still being generated
+explanation_cache = TTLCache("explanation_cache", ttl=EXPLAIN_CACHE_TTL, maxsize=512)
+
+
+class Explanation:
+    """Explanation text that grows as the LLM streams it; readers wait on cond"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.status = "pending"  # pending | done | error
+        self.chunks = []
+        self.error = None
+        self.cond = threading.Condition()
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    def to_dict(self):
+        with self.cond:
+            return {
+                "explanation_id": self.handle,
+                "status": self.status,
+                "explanation": self.text if self.status == "done" else None,
+                "error": self.error,
+            }
+
+
+def result_handle(sql, columns, rows):
+    """Explanation id for a query result: hash of the SQL and of the rows it returned"""
+    result_hash = hashlib.sha1(dumps([columns, rows])).hexdigest()
+    return hashlib.sha1(f"{sql}\n{result_hash}".encode("utf-8")).hexdigest()[:20]
+
+
+def get(handle):
+    """The Explanation for handle (running or cached), or None"""
+    with _lock:
+        entry = _running.get(handle)
+    return entry or explanation_cache.get(handle)
+
+
+def _generate(entry, messages):
+    try:
+        with metrics.timed("explanation.generate"):
+            for chunk in llm_chat_stream(messages, temperature=0.2):
+                with entry.cond:
+                    entry.chunks.append(chunk)
+                    entry.cond.notify_all()
+        with entry.cond:
+            entry.status = "done"
+            entry.cond.notify_all()
+        explanation_cache.set(entry.handle, entry)
+    except Exception as e:
+        with entry.cond:
+            entry.status = "error"
+            entry.error = str(e)
+            entry.cond.notify_all()
+        explanation_cache.set(entry.handle, entry, ttl=getattr(e, "retry_after", EXPLAIN_ERROR_TTL))
+    finally:
+        with _lock:
+            _running.pop(entry.handle, None)
+
+
+def submit(question, sql, columns, rows, params=None):
+    """
+    Start explaining a query result in the worker pool, unless it is cached or running
+
+    Returns:
+        The Explanation (possibly already done)
+    """
+    handle = result_handle(sql, columns, rows)
+    cached = explanation_cache.get(handle)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        entry = _running.get(handle)
+        if entry is not None:
+            return entry
+        entry = _running[handle] = Explanation(handle)
+
+    context = {
+        "question": question,
+        "sql": sql,
+        "params": params or {},
+        "columns": columns,
+        "sample_rows": rows[:20],
+        "row_count": len(rows),
+    }
+    messages = [
+        {"role": "system", "content": EXPLAIN_SYSTEM},
+        {"role": "user", "content": dumps(context).decode("utf-8")},  # rows may hold datetimes
+    ]
+    _executor.submit(_generate, entry, messages)
+    return entry
+
+
+def wait(entry, timeout):
+    """Block until entry is finished or timeout seconds pass"""
+    with entry.cond:
+        entry.cond.wait_for(lambda: entry.status != "pending", timeout=timeout)
+
+
+def iter_chunks(entry, timeout):
+    """
+    Yield the explanation's text chunks as they are generated
+
+    Raises:
+        RuntimeError: if generation fails or no new text arrives within timeout seconds
+    """
+    sent = 0
+    while True:
+        with entry.cond:
+            if not entry.cond.wait_for(lambda: len(entry.chunks) > sent or entry.status != "pending", timeout=timeout):
+                raise RuntimeError("Timed out waiting for the explanation")
+            new = entry.chunks[sent:]
+            status, error = entry.status, entry.error
+        for chunk in new:
+            yield chunk
+        sent += len(new)
+        if status == "error":
+            raise RuntimeError(error)
+        if status == "done" and sent == len(entry.chunks):
+            return
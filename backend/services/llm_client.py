@@ -1,30 +1,173 @@
-import os, json, re, requests
+import os, json, math, re, random, threading, time, requests
+from collections import deque
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+
+from services import metrics
 
 # Use the docker service host, override via env if needed
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
 LLM_MODEL  = os.getenv("LLM_MODEL", "llama3:8b")
+LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "2048"))  # context window requested from Ollama (prompt + reply)
+
+# Connection handling: one pooled keep-alive session per process
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT    = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_POOL_SIZE       = int(os.getenv("LLM_POOL_SIZE", "10"))
+LLM_MAX_RETRIES     = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF   = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))  # seconds, doubled per attempt
+
+# Gateway/overload responses worth retrying; read timeouts are not (the model is just slow)
+RETRY_STATUSES = {502, 503, 504}
+
+# Concurrency limit per worker process: calls beyond LLM_MAX_INFLIGHT wait in a FIFO queue
+LLM_MAX_INFLIGHT    = int(os.getenv("LLM_MAX_INFLIGHT", "2"))
+LLM_QUEUE_SIZE      = int(os.getenv("LLM_QUEUE_SIZE", "8"))
+LLM_QUEUE_TIMEOUT   = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # seconds a call may wait for a slot
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class _TransientError(Exception):
+    pass
+
+
+class LLMBusy(RuntimeError):
+    """No LLM slot is free and the queue is full (or the wait timed out); retry after retry_after seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Limiter:
+    """At most max_inflight concurrent calls; others wait in FIFO order, up to max_queue of them"""
+
+    def __init__(self, max_inflight, max_queue, max_wait):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._waiters = deque()  # one Event per queued call, set when a slot is handed to it
+        self._avg_seconds = 10.0  # moving average call duration, for Retry-After
+
+    def _retry_after(self):
+        # Time for the queue ahead to drain at the current call rate
+        rounds = (len(self._waiters) + 1) / max(self.max_inflight, 1)
+        return max(1, math.ceil(rounds * self._avg_seconds))
+
+    def _gauges(self):
+        metrics.set_gauge("llm.inflight", self._inflight)
+        metrics.set_gauge("llm.queue_depth", len(self._waiters))
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._waiters:
+                self._inflight += 1
+                self._gauges()
+                metrics.observe("llm.queue_wait", 0.0)
+                return
+            if len(self._waiters) >= self.max_queue:
+                metrics.incr("llm.rejected")
+                raise LLMBusy("LLM is busy, queue is full", self._retry_after())
+            ready = threading.Event()
+            self._waiters.append(ready)
+            self._gauges()
+
+        if not ready.wait(self.max_wait):
+            with self._lock:
+                # The slot may have been handed over between the timeout and taking the lock
+                if not ready.is_set():
+                    self._waiters.remove(ready)
+                    self._gauges()
+                    metrics.incr("llm.queue_timeouts")
+                    raise LLMBusy(f"Timed out after {self.max_wait:g}s waiting for the LLM", self._retry_after())
+        metrics.observe("llm.queue_wait", time.perf_counter() - start)
+
+    def release(self, seconds):
+        with self._lock:
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes straight to the next caller
+            else:
+                self._inflight -= 1
+            self._gauges()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+
+limiter = _Limiter(LLM_MAX_INFLIGHT, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+
+
+def get_session():
+    """Shared requests.Session whose connection pool keeps Ollama connections alive"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
 
-def chat(messages, temperature=0.2, json_mode=False, model=None, timeout=120):
-    """Call Ollama /api/chat. messages=[{role:'system'|'user'|'assistant', content:str}]"""
+def _post(url, payload, timeout, stream=False):
+    """POST with bounded retries (full jitter) on connection errors and retryable statuses"""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            r = get_session().post(url, json=payload, timeout=timeout, stream=stream)
+            if r.status_code in RETRY_STATUSES:
+                r.close()
+                raise _TransientError(f"{r.status_code} {r.reason}")
+            r.raise_for_status()
+            return r
+        except (requests.ConnectionError, requests.ConnectTimeout, _TransientError) as e:
+            if attempt >= LLM_MAX_RETRIES:
+                raise RuntimeError(str(e))
+            metrics.incr("llm.retries")
+            time.sleep(random.uniform(0, LLM_RETRY_BACKOFF * (2 ** attempt)))
+
+
+def chat(messages, temperature=0.2, json_mode=False, model=None, timeout=None):
+    """Call Ollama /api/chat. messages=[{role:'system'|'user'|'assistant', content:str}]
+
+    timeout overrides the read timeout (LLM_READ_TIMEOUT); connecting is bounded by LLM_CONNECT_TIMEOUT.
+    """
     url = f"{OLLAMA_URL.rstrip('/')}/api/chat"
     payload = {
-        "model": LLM_MODEL,
+        "model": model or LLM_MODEL,
         "messages": messages,
         "stream": False,
         "options": {
             "temperature": temperature,
-            "num_ctx": 2048,
+            "num_ctx": LLM_NUM_CTX,
         },
         "keep_alive": "30m"
     }
 
-    try:
-        r = requests.post(url, json=payload, timeout=timeout)
-        r.raise_for_status()
-        data = r.json()
-        content = data.get("message", {}).get("content") or data.get("response", "")
-    except Exception as e:
-        raise RuntimeError(f"Ollama call failed: {e}")
+    with limiter.slot():
+        start = time.perf_counter()
+        try:
+            r = _post(url, payload, (LLM_CONNECT_TIMEOUT, timeout or LLM_READ_TIMEOUT))
+            data = r.json()
+            content = data.get("message", {}).get("content") or data.get("response", "")
+        except Exception as e:
+            metrics.incr("llm.errors")
+            raise RuntimeError(f"Ollama call failed: {e}")
+        finally:
+            metrics.observe("llm.chat", time.perf_counter() - start)
 
     if not json_mode:
         return content
@@ -34,3 +177,61 @@ def chat(messages, temperature=0.2, json_mode=False, model=None, timeout=120):
     except Exception:
         m = re.search(r"\{[\s\S]*\}", content)
         return json.loads(m.group(0)) if m else {}
+
+
+def chat_stream(messages, temperature=0.2, model=None, timeout=None):
+    """Like chat(), but yields the reply's text chunks as Ollama generates them.
+
+    Closing the generator (e.g. when the HTTP client goes away) closes the Ollama
+    connection, which stops generation. Retries only happen before the first chunk.
+    """
+    url = f"{OLLAMA_URL.rstrip('/')}/api/chat"
+    payload = {
+        "model": model or LLM_MODEL,
+        "messages": messages,
+        "stream": True,
+        "options": {
+            "temperature": temperature,
+            "num_ctx": LLM_NUM_CTX,
+        },
+        "keep_alive": "30m"
+    }
+
+    # The slot is held until the stream is consumed or closed
+    limiter.acquire()
+    start = time.perf_counter()
+    try:
+        r = _post(url, payload, (LLM_CONNECT_TIMEOUT, timeout or LLM_READ_TIMEOUT), stream=True)
+    except Exception as e:
+        limiter.release(time.perf_counter() - start)
+        metrics.incr("llm.errors")
+        raise RuntimeError(f"Ollama call failed: {e}")
+
+    first = True
+    try:
+        for line in r.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama call failed: {data['error']}")
+            content = data.get("message", {}).get("content") or data.get("response", "")
+            if content:
+                if first:
+                    metrics.observe("llm.first_token", time.perf_counter() - start)
+                    first = False
+                yield content
+    except GeneratorExit:
+        metrics.incr("llm.cancelled")
+        raise
+    except RuntimeError:
+        metrics.incr("llm.errors")
+        raise
+    except Exception as e:
+        metrics.incr("llm.errors")
+        raise RuntimeError(f"Ollama stream failed: {e}")
+    finally:
+        # Dropping the connection mid-stream tells Ollama to stop generating
+        r.close()
+        limiter.release(time.perf_counter() - start)
+        metrics.observe("llm.chat_stream", time.perf_counter() - start)
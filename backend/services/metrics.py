@@ -0,0 +1,70 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics registry shared by all services (one per worker process)
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_gauges = {}
+
+
+def incr(name, amount=1):
+    """Increment a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    """Record the current value of a gauge (e.g. a queue depth)"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Record one duration sample"""
+    with _lock:
+        t = _timings.get(name)
+        if t is None:
+            t = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+        t['count'] += 1
+        t['total'] += seconds
+        t['last'] = seconds
+        if seconds > t['max']:
+            t['max'] = seconds
+
+
+@contextmanager
+def timed(name):
+    """Context manager that records the duration of its block under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot():
+    """Return a JSON-serializable copy of all metrics"""
+    with _lock:
+        timings = {}
+        for name, t in _timings.items():
+            timings[name] = {
+                'count': t['count'],
+                'avg_ms': round(1000.0 * t['total'] / t['count'], 2) if t['count'] else 0.0,
+                'max_ms': round(1000.0 * t['max'], 2),
+                'last_ms': round(1000.0 * t['last'], 2)
+            }
+        # Hit rate for every <name>.hits / <name>.misses counter pair (e.g. caches)
+        hit_rates = {}
+        prefixes = {name.rsplit('.', 1)[0] for name in _counters if name.endswith(('.hits', '.misses'))}
+        for prefix in prefixes:
+            hits = _counters.get(f'{prefix}.hits', 0)
+            total = hits + _counters.get(f'{prefix}.misses', 0)
+            hit_rates[prefix] = round(hits / total, 4) if total else 0.0
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timings': timings,
+            'hit_rates': hit_rates
+        }
@@ -0,0 +1,312 @@
+"""Deterministic English -> SQL compiler for common ask-sql questions.
+
+Questions are matched against a small grammar (log ids, user, session, action,
+IP, time window, flagged, counts, group-bys, top-N and listing size). Every
+value from the question is bound as a parameter. If any meaningful word is left
+unrecognized the compiler declines and ask-sql falls back to the LLM.
+"""
+import re
+from datetime import datetime, timedelta
+
+COLS = (
+    "log_id,user_id,action_type,action_detail,page_url,ip_address,"
+    "log_timestamp,session_id,user_agent,geo_location,is_flagged,log_type"
+)
+SESSION_COLS = "session_id,user_id,start_time,end_time"
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Words that carry no meaning once the recognized phrases are removed. "user"/"users" are
+# deliberately absent: left over, they mean users are the subject ("how many users"), which
+# the user_logs queries below cannot answer, so the question goes to the LLM. "most" is
+# absent for the same reason: outside the phrases that handle it ("most active users",
+# "most recent", "who ... the most") it asks for a ranking a listing cannot give.
+FILLER = {
+    "a", "all", "an", "and", "any", "are", "at", "been", "by", "did", "do", "does", "each", "entries",
+    "entry", "event", "events", "find", "for", "from", "get", "give", "had", "happened", "has", "have",
+    "how", "i", "in", "is", "it", "its", "list", "log", "logs", "made", "many", "me", "of", "on",
+    "please", "recent", "records", "show", "that", "the", "there", "to", "total", "was", "were",
+    "what", "which", "who", "with", "activity", "activities", "action", "actions",
+    "occurred", "performed", "latest", "number", "count", "display", "see", "can", "you",
+    "whose", "my", "our", "s", "per", "sessions", "session", "rows", "row",
+}
+
+# Action concepts -> LIKE patterns on LOWER(action_type); checked in order
+ACTION_CONCEPTS = [
+    ("failed_login", r"\b(?:failed|unsuccessful)\s+log\s?ins?\b|\blog\s?in\s+(?:failures?|failed|errors?)\b",
+     ["%login%fail%", "%fail%login%", "%login%error%"]),
+    ("login", r"\b(?:successful\s+)?log\s?ins?\b|\bsign\s?ins?\b", ["login", "login_success"]),
+    ("logout", r"\blog\s?outs?\b|\bsign\s?outs?\b", ["%logout%"]),
+    ("export", r"\bexports?\b|\bexported\b|\bdownloads?\b", ["%export%", "%download%"]),
+    ("delete", r"\bdelet(?:e|es|ed|ions?)\b|\bremov(?:e|es|ed|als?)\b", ["%delete%", "%remove%"]),
+    ("update", r"\bupdat(?:e|es|ed)\b|\bedits?\b|\bedited\b", ["%update%", "%edit%"]),
+    ("create", r"\bcreat(?:e|es|ed|ions?)\b|\badd(?:s|ed)?\b", ["%create%", "%add%"]),
+    ("view", r"\bviews?\b|\bviewed\b", ["%view%"]),
+]
+
+# Group-by dimensions: name -> (SELECT expressions, GROUP BY expression, default ORDER BY)
+DIMENSIONS = {
+    "user": ("user_logs.user_id, users.username", "user_logs.user_id, users.username", "count DESC"),
+    "action": ("user_logs.action_type", "user_logs.action_type", "count DESC"),
+    "ip": ("user_logs.ip_address", "user_logs.ip_address", "count DESC"),
+    "day": ("DATE(user_logs.log_timestamp) AS day", "DATE(user_logs.log_timestamp)", "day DESC"),
+    "hour": ("HOUR(user_logs.log_timestamp) AS hour", "HOUR(user_logs.log_timestamp)", "hour ASC"),
+    "session": ("user_logs.session_id", "user_logs.session_id", "count DESC"),
+}
+DIMENSION_WORDS = [
+    ("user", r"users?|usernames?|accounts?"),
+    ("action", r"action\s+types?|actions?|action_types?|event\s+types?"),
+    ("ip", r"ip\s+address(?:es)?|ips?|ip_address(?:es)?"),
+    ("day", r"days?|dates?|daily"),
+    ("hour", r"hours?|hourly|hour\s+of\s+(?:the\s+)?day"),
+    ("session", r"sessions?"),
+]
+_DIM_ALT = "|".join(f"(?P<{name}>{words})" for name, words in DIMENSION_WORDS)
+
+TIME_UNITS = {"m": "minutes", "min": "minutes", "mins": "minutes", "minute": "minutes", "minutes": "minutes",
+              "h": "hours", "hr": "hours", "hrs": "hours", "hour": "hours", "hours": "hours",
+              "d": "days", "day": "days", "days": "days", "w": "weeks", "week": "weeks", "weeks": "weeks",
+              "month": "days", "months": "days"}
+
+
+class _Question:
+    """Lower-cased question text with recognized spans blanked out as they are consumed"""
+
+    def __init__(self, question):
+        self.text = " " + re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.!") + " "
+
+    def take(self, pattern):
+        m = re.search(pattern, self.text)
+        if m:
+            self.text = self.text[:m.start()] + " " + self.text[m.end():]
+        return m
+
+    def leftover(self):
+        return [w for w in re.findall(r"[a-z0-9_']+", self.text) if w.strip("'") not in FILLER]
+
+
+def _dimension(m):
+    return next(name for name, _ in DIMENSION_WORDS if m.group(name))
+
+
+def _log_id_shortcuts(q):
+    """Explicit log id questions: ranges, id lists, a single log, or the Nth row by time"""
+    m = re.search(r"\blogs?\s*(\d+)\s*(?:-|to)\s*(\d+)\b", q)
+    if m:
+        lo, hi = sorted((int(m.group(1)), int(m.group(2))))
+        span = min(hi - lo + 1, MAX_LIMIT)
+        return (f"SELECT {COLS} FROM user_logs WHERE log_id BETWEEN :lo AND :hi "
+                f"ORDER BY log_id ASC LIMIT {span}", {"lo": lo, "hi": hi})
+
+    m = re.search(r"\blogs?\s+((?:\d+[,\s]+)+\d+)\b", q)
+    if m:
+        ids = sorted({int(x) for x in re.findall(r"\d+", m.group(1))})[:MAX_LIMIT]
+        params = {f"id{i}": v for i, v in enumerate(ids)}
+        placeholders = ",".join(f":{k}" for k in params)
+        return (f"SELECT {COLS} FROM user_logs WHERE log_id IN ({placeholders}) "
+                f"ORDER BY log_id ASC LIMIT {len(ids)}", params)
+
+    m = re.search(r"\b(?:log_id|log)\s*[:#]?\s*(\d+)\b", q)
+    if m:
+        return f"SELECT {COLS} FROM user_logs WHERE log_id = :log_id LIMIT 1", {"log_id": int(m.group(1))}
+
+    m = re.search(r"\brow\s+(\d+)\b", q)
+    if m:
+        n = max(1, int(m.group(1)))
+        return f"SELECT {COLS} FROM user_logs ORDER BY log_timestamp ASC LIMIT 1 OFFSET {n - 1}", {}
+
+    return None
+
+
+def _time_window(q, now):
+    """
+    (since, until) from phrases like 'last 24h', 'past 7 days', 'today', 'since 2025-10-01'
+
+    Returns (None, None) when the question has no time window, and None when it names a
+    date that does not exist, so the caller can decline.
+    """
+    m = q.take(r"\b(?:in\s+|during\s+|over\s+|within\s+)?(?:the\s+)?(?:last|past|previous)\s+(\d+)\s*"
+               r"(m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?|months?)\b")
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        if unit.startswith("month"):
+            n *= 30
+        return now - timedelta(**{TIME_UNITS[unit]: n}), None
+
+    m = q.take(r"\b(?:in\s+|during\s+|over\s+|within\s+)?(?:the\s+)?(?:last|past|previous)\s+(hour|day|week|month)\b")
+    if m:
+        unit = m.group(1)
+        return now - (timedelta(days=30) if unit == "month" else timedelta(**{TIME_UNITS[unit]: 1})), None
+
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if q.take(r"\btoday\b"):
+        return midnight, None
+    if q.take(r"\byesterday\b"):
+        return midnight - timedelta(days=1), midnight
+    if q.take(r"\bthis\s+week\b"):
+        return midnight - timedelta(days=midnight.weekday()), None
+
+    try:
+        m = q.take(r"\bbetween\s+(\d{4}-\d{2}-\d{2})\s+and\s+(\d{4}-\d{2}-\d{2})\b")
+        if m:
+            return datetime.fromisoformat(m.group(1)), datetime.fromisoformat(m.group(2)) + timedelta(days=1)
+        m = q.take(r"\bon\s+(\d{4}-\d{2}-\d{2})\b")
+        if m:
+            day = datetime.fromisoformat(m.group(1))
+            return day, day + timedelta(days=1)
+        m = q.take(r"\b(?:since|after|from)\s+(\d{4}-\d{2}-\d{2})\b")
+        if m:
+            return datetime.fromisoformat(m.group(1)), None
+    except ValueError:
+        return None  # well-formed but impossible date ('2025-13-45')
+
+    return None, None
+
+
+def compile_question(question, now=None):
+    """
+    Compile a question to parameterized SQL
+
+    Args:
+        question: The analyst's question in English
+        now: Reference time for relative windows (defaults to utcnow, rounded down to the
+            minute so a rolling window binds the same params, and hits the result cache,
+            for a minute)
+
+    Returns:
+        (sql, params) or None when the question is outside the grammar
+    """
+    now = now or datetime.utcnow().replace(second=0, microsecond=0)
+    q = _Question(question)
+
+    shortcut = _log_id_shortcuts(q.text)
+    if shortcut:
+        return shortcut
+
+    sessions = bool(re.search(r"\bsessions\b", q.text)) and not re.search(r"\b(?:by|per)\s+sessions?\b", q.text)
+    conditions, params = [], {}
+
+    # Filters
+    ts_col = "sessions.start_time" if sessions else "user_logs.log_timestamp"
+    table = "sessions" if sessions else "user_logs"
+
+    m = q.take(r"\buser(?:_id|\s+id)?\s*#?\s*(\d+)\b")
+    if m:
+        conditions.append(f"{table}.user_id = :user_id")
+        params["user_id"] = int(m.group(1))
+    else:
+        m = (q.take(r"\buser(?:name)?\s+[\"']([\w.@-]+)[\"']")
+             or q.take(r"\busername\s+([\w.@-]+)\b"))
+        if not m:
+            candidate = re.search(r"\buser\s+([a-z][\w.@-]*)\b", q.text)
+            if candidate and candidate.group(1) not in FILLER:
+                m = q.take(r"\buser\s+(" + re.escape(candidate.group(1)) + r")\b")
+        if m:
+            conditions.append(f"{table}.user_id IN (SELECT user_id FROM users WHERE username = :username)")
+            params["username"] = m.group(1)
+
+    # Counts, top-N and group-bys
+    count = bool(q.take(r"\bhow\s+many\b|\bnumber\s+of\b|\bcount(?:s)?\b|\btotal\b"))
+    top_n, dimension = None, None
+    m = q.take(rf"\btop\s+(\d+)\s+(?:{_DIM_ALT})\b")
+    if m:
+        top_n, dimension = int(m.group(1)), _dimension(m)
+    else:
+        m = q.take(rf"\bmost\s+(?:active|frequent|common)\s+(?:{_DIM_ALT})\b")
+        if m:
+            top_n, dimension = 10, _dimension(m)
+    if dimension is None and re.search(r"\bwho\b", q.text):
+        # 'who exported the most': rank users rather than list the matching rows
+        if q.take(r"\b(?:the\s+)?most\b(?!\s+(?:recent|active|frequent|common)\b)"):
+            top_n, dimension = 10, "user"
+    if dimension is None:
+        m = q.take(rf"\b(?:grouped\s+by|group\s+by|broken\s+down\s+by|by|per|for\s+each|each)\s+(?:{_DIM_ALT})\b(?!\s*(?:#|id\b|_id\b)?\s*\d)")
+        if m:
+            dimension = _dimension(m)
+
+    if sessions:
+        if q.take(r"\b(?:active|open|ongoing)\b"):
+            conditions.append("sessions.end_time IS NULL")
+    else:
+        m = q.take(r"\bsession(?:_id|\s+id)?\s+([\w-]*\d[\w-]*)\b")
+        if m:
+            conditions.append("user_logs.session_id = :session_id")
+            params["session_id"] = m.group(1)
+
+        m = q.take(r"\b(?:from\s+|by\s+|on\s+)?(?:ip(?:\s+address)?\s+)?(\d{1,3}(?:\.\d{1,3}){3})\b")
+        if m:
+            conditions.append("user_logs.ip_address = :ip")
+            params["ip"] = m.group(1)
+
+        if q.take(r"\b(?:flagged|suspicious)\b"):
+            conditions.append("user_logs.is_flagged = 1")
+
+        m = q.take(r"\baction(?:_type|\s+type)?\s+[\"']?([a-z][\w-]*)[\"']?")
+        if m and m.group(1) not in FILLER:
+            conditions.append("LOWER(user_logs.action_type) = :action_type")
+            params["action_type"] = m.group(1)
+        else:
+            for name, pattern, likes in ACTION_CONCEPTS:
+                if q.take(pattern):
+                    keys = [f"{name}{i}" for i in range(len(likes))]
+                    ops = ["LIKE" if "%" in like else "=" for like in likes]
+                    conditions.append("(" + " OR ".join(f"LOWER(user_logs.action_type) {op} :{k}" for op, k in zip(ops, keys)) + ")")
+                    params.update(zip(keys, likes))
+                    break
+
+    window = _time_window(q, now)
+    if window is None:
+        return None
+    since, until = window
+    if since:
+        conditions.append(f"{ts_col} >= :since")
+        params["since"] = since
+    if until:
+        conditions.append(f"{ts_col} < :until")
+        params["until"] = until
+
+    # Listing size: 'last 20 logs', 'first 5 events'
+    limit, order = None, "DESC"
+    m = q.take(r"\b(last|latest|recent|newest|most\s+recent|first|oldest|earliest)\s+(\d+)\b")
+    if m:
+        limit = int(m.group(2))
+        order = "ASC" if m.group(1) in ("first", "oldest", "earliest") else "DESC"
+    elif q.take(r"\b(?:oldest|earliest)\b"):
+        order = "ASC"
+    else:
+        q.take(r"\bmost\s+recent\b")
+
+    if q.leftover():
+        return None
+
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    if sessions:
+        if dimension not in (None, "user"):
+            return None
+        if dimension == "user":
+            return (f"SELECT sessions.user_id, users.username, COUNT(*) AS count FROM sessions "
+                    f"LEFT JOIN users ON users.user_id = sessions.user_id{where} "
+                    f"GROUP BY sessions.user_id, users.username ORDER BY count DESC LIMIT {min(top_n or MAX_LIMIT, MAX_LIMIT)}", params)
+        if count:
+            return f"SELECT COUNT(*) AS count FROM sessions{where} LIMIT 1", params
+        return (f"SELECT {SESSION_COLS} FROM sessions{where} ORDER BY start_time {order} "
+                f"LIMIT {min(limit or DEFAULT_LIMIT, MAX_LIMIT)}", params)
+
+    # Coalesced rows stand for event_count identical events, as in the activity summary;
+    # the outer COALESCE gives 0 rather than NULL when no row matches
+    events = "COALESCE(SUM(COALESCE(user_logs.event_count, 1)), 0) AS count"
+    if dimension:
+        select, group, default_order = DIMENSIONS[dimension]
+        join = " LEFT JOIN users ON users.user_id = user_logs.user_id" if dimension == "user" else ""
+        order_by = "count DESC" if top_n else default_order
+        return (f"SELECT {select}, {events} FROM user_logs{join}{where} "
+                f"GROUP BY {group} ORDER BY {order_by} LIMIT {min(top_n or limit or MAX_LIMIT, MAX_LIMIT)}", params)
+
+    if count:
+        return f"SELECT {events} FROM user_logs{where} LIMIT 1", params
+
+    cols = ",".join(f"user_logs.{c}" for c in COLS.split(","))
+    return (f"SELECT {cols} FROM user_logs{where} ORDER BY user_logs.log_timestamp {order} "
+            f"LIMIT {min(limit or DEFAULT_LIMIT, MAX_LIMIT)}", params)
@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp, row_id):
+    """Build an opaque cursor token from the sort key of the last row on a page"""
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token produced by encode_cursor
+
+    Returns:
+        (timestamp, row_id) tuple
+
+    Raises:
+        ValueError: if the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        ts, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(ts) if ts else None), row_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def clamp_page_size(limit):
+    """Keep requested page sizes within sane bounds"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def page_query(query, ts_column, id_column, cursor, limit):
+    """
+    query restricted to one page, newest first, plus one extra row to tell whether another page exists
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    if cursor:
+        c_ts, c_id = decode_cursor(cursor)
+        if c_ts is None:
+            query = query.filter(ts_column.is_(None), id_column < c_id)
+        else:
+            query = query.filter(or_(
+                ts_column < c_ts,
+                and_(ts_column == c_ts, id_column < c_id),
+                ts_column.is_(None)
+            ))
+    return query.order_by(ts_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def keyset_page(query, ts_column, id_column, cursor, limit):
+    """
+    Fetch one page ordered newest first using keyset pagination on (ts_column, id_column)
+
+    Rows inserted while a client is paging sort ahead of the cursor, so later pages
+    never repeat or skip rows the way OFFSET paging does.
+
+    Args:
+        query: SQLAlchemy query with filters already applied
+        ts_column: Timestamp column to order by
+        id_column: Unique tie-breaker column
+        cursor: Token from a previous page's next_cursor, or None for the first page
+        limit: Page size
+
+    Returns:
+        (rows, next_cursor) where next_cursor is None on the last page
+    """
+    rows = page_query(query, ts_column, id_column, cursor, limit).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, ts_column.key), getattr(last, id_column.key))
+
+    return rows, next_cursor
@@ -0,0 +1,117 @@
+import gzip
+import zlib
+from decimal import Decimal
+
+import orjson
+from flask import Response, request, current_app, stream_with_context
+
+try:
+    import brotli  # optional: pip install brotli to offer Content-Encoding: br
+except ImportError:
+    brotli = None
+
+# Rows encoded per chunk when streaming a JSON array
+STREAM_BATCH_SIZE = 500
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _default(obj):
+    # Same representation jsonify uses for Decimal (datetimes are ISO 8601 via orjson)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """Encode obj to JSON bytes with orjson (datetime, date and Decimal supported)"""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _negotiate_encoding():
+    """Best Content-Encoding the client accepts, or None"""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip container
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def json_response(payload, status=200):
+    """
+    JSON response encoded with orjson, compressed when large enough
+
+    Bodies of at least RESPONSE_COMPRESS_MIN_BYTES are gzip (or brotli, if installed)
+    compressed according to the client's Accept-Encoding.
+    """
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate_encoding()
+    if encoding and len(body) >= current_app.config.get('RESPONSE_COMPRESS_MIN_BYTES', 1024):
+        if encoding == 'br':
+            response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        else:
+            response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def json_array_response(items, serialize=None, status=200):
+    """
+    Stream a JSON array, encoding STREAM_BATCH_SIZE items per chunk
+
+    Args:
+        items: Iterable of items (e.g. ORM rows)
+        serialize: Optional callable applied to each item before encoding (e.g. Model.to_dict)
+
+    The whole array is never held as one string; when the client accepts it the
+    stream is compressed on the fly. Lists shorter than one batch are sent as a
+    single body so the compression size threshold applies.
+    """
+    if isinstance(items, (list, tuple)) and len(items) < STREAM_BATCH_SIZE:
+        return json_response([serialize(item) for item in items] if serialize else items, status=status)
+
+    def generate():
+        yield b'['
+        batch = []
+        first = True
+        for item in items:
+            batch.append(dumps(serialize(item) if serialize else item))
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield (b'' if first else b',') + b','.join(batch)
+                first = False
+                batch = []
+        if batch:
+            yield (b'' if first else b',') + b','.join(batch)
+        yield b']'
+
+    chunks = generate()
+    encoding = _negotiate_encoding()
+    if encoding:
+        chunks = _compress_stream(chunks, encoding)
+
+    response = Response(stream_with_context(chunks), status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
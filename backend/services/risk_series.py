@@ -0,0 +1,133 @@
+from datetime import datetime, date
+from decimal import Decimal
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from extensions import db
+from models import UserRiskDaily, AnomalyScore, RuleBasedDetection, FlaggedActivity, UserLog
+
+
+def _upsert(user_id, day, max_score=0, score_sum=0, detections=0, flags=0):
+    """Add onto the (user_id, day) row in the caller's transaction, creating it if needed"""
+    max_score = Decimal(str(max_score or 0))
+    score_sum = Decimal(str(score_sum or 0))
+
+    if db.session.get_bind().dialect.name == 'mysql':
+        # Atomic upsert so concurrent workers never race on row creation
+        stmt = mysql_insert(UserRiskDaily.__table__).values(
+            user_id=user_id, day=day, max_score=max_score, score_sum=score_sum,
+            detections=detections, flags=flags
+        )
+        stmt = stmt.on_duplicate_key_update(
+            max_score=db.func.greatest(UserRiskDaily.__table__.c.max_score, stmt.inserted.max_score),
+            score_sum=UserRiskDaily.__table__.c.score_sum + stmt.inserted.score_sum,
+            detections=UserRiskDaily.__table__.c.detections + stmt.inserted.detections,
+            flags=UserRiskDaily.__table__.c.flags + stmt.inserted.flags
+        )
+        db.session.execute(stmt)
+        return
+
+    row = db.session.get(UserRiskDaily, (user_id, day))
+    if row is None:
+        row = UserRiskDaily(user_id=user_id, day=day, max_score=0, score_sum=0, detections=0, flags=0)
+        db.session.add(row)
+    row.max_score = max(Decimal(str(row.max_score or 0)), max_score)
+    row.score_sum = Decimal(str(row.score_sum or 0)) + score_sum
+    row.detections = (row.detections or 0) + detections
+    row.flags = (row.flags or 0) + flags
+
+
+def _day(at):
+    if isinstance(at, datetime):
+        return at.date()
+    return at or datetime.utcnow().date()
+
+
+def record_detection(user_id, at, risk_score):
+    """Count one persisted detection (anomaly score or rule-based) in the user's daily series"""
+    if user_id is None:
+        return
+    _upsert(user_id, _day(at), max_score=risk_score, score_sum=risk_score, detections=1)
+
+
+def record_flags(user_id, at, count=1):
+    """Count flagged activities in the user's daily series"""
+    if user_id is None or not count:
+        return
+    _upsert(user_id, _day(at), flags=count)
+
+
+def get_risk_series(user_id, start, end):
+    """Daily rows for user_id with start <= day <= end, oldest first"""
+    rows = UserRiskDaily.query.filter(
+        UserRiskDaily.user_id == user_id,
+        UserRiskDaily.day >= start,
+        UserRiskDaily.day <= end
+    ).order_by(UserRiskDaily.day.asc()).all()
+    return [r.to_dict() for r in rows]
+
+
+def rebuild_risk_series(start=None, end=None):
+    """
+    Recompute the series from anomaly_scores, rule_based_detections and flags
+
+    Args:
+        start, end: Optional inclusive day bounds; all history when omitted
+
+    Returns:
+        Number of daily rows written
+    """
+    def day_range(column):
+        criteria = []
+        if start:
+            criteria.append(db.func.date(column) >= start)
+        if end:
+            criteria.append(db.func.date(column) <= end)
+        return criteria
+
+    try:
+        delete_q = UserRiskDaily.query
+        if start:
+            delete_q = delete_q.filter(UserRiskDaily.day >= start)
+        if end:
+            delete_q = delete_q.filter(UserRiskDaily.day <= end)
+        delete_q.delete(synchronize_session=False)
+
+        totals = {}
+
+        def add(user_id, day, max_score=0, score_sum=0, detections=0, flags=0):
+            if user_id is None:
+                return
+            key = (user_id, date.fromisoformat(str(day)))
+            t = totals.setdefault(key, [Decimal('0'), Decimal('0'), 0, 0])
+            t[0] = max(t[0], Decimal(str(max_score or 0)))
+            t[1] += Decimal(str(score_sum or 0))
+            t[2] += int(detections or 0)
+            t[3] += int(flags or 0)
+
+        for model, ts_col in ((AnomalyScore, AnomalyScore.created_at), (RuleBasedDetection, RuleBasedDetection.detected_at)):
+            day_col = db.func.date(ts_col)
+            rows = db.session.query(
+                model.user_id, day_col, db.func.max(model.risk_score),
+                db.func.sum(model.risk_score), db.func.count()
+            ).filter(*day_range(ts_col)).group_by(model.user_id, day_col).all()
+            for user_id, day, max_score, score_sum, count in rows:
+                add(user_id, day, max_score=max_score, score_sum=score_sum, detections=count)
+
+        day_col = db.func.date(FlaggedActivity.flagged_at)
+        rows = db.session.query(UserLog.user_id, day_col, db.func.count(FlaggedActivity.flag_id)).join(
+            UserLog, FlaggedActivity.log_id == UserLog.log_id
+        ).filter(*day_range(FlaggedActivity.flagged_at)).group_by(UserLog.user_id, day_col).all()
+        for user_id, day, count in rows:
+            add(user_id, day, flags=count)
+
+        for (user_id, day), (max_score, score_sum, detections, flags) in totals.items():
+            db.session.add(UserRiskDaily(
+                user_id=user_id, day=day, max_score=max_score, score_sum=score_sum,
+                detections=detections, flags=flags
+            ))
+        db.session.commit()
+        return len(totals)
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,301 @@
+"""
+Hourly rollups of activity logs, anomaly scores and flags
+
+Rollup rows are folded in incrementally: each source table has a watermark
+holding the highest row id already counted, and refresh_rollups() aggregates
+only rows above it. Readers combine the rollups with a raw count of the
+partial first hour of the range and of rows above the watermark, so results
+are exact without waiting for the next refresh.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+import threading
+import time
+
+from flask import current_app
+from extensions import db
+from models import UserLog, AnomalyScore, FlaggedActivity, ActivityRollup, SecurityRollup, RollupWatermark
+
+ACTIVITY_SOURCE = 'user_logs'
+SCORE_SOURCE = 'anomaly_scores'
+FLAG_SOURCE = 'flagged_activity'
+
+ACTIVITY_KEYS = ('bucket_start', 'user_id', 'action_type')
+SECURITY_KEYS = ('bucket_start', 'user_id', 'source', 'severity')
+
+_refresh_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def hour_floor(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(ts):
+    floor = hour_floor(ts)
+    return floor if floor == ts else floor + timedelta(hours=1)
+
+
+def _bucket(day, hour):
+    """Build the bucket start from DATE() and HOUR() results"""
+    return datetime.fromisoformat(str(day)).replace(hour=int(hour or 0))
+
+
+def _activity_groups(*criteria):
+    """(bucket_start, user_id, action_type, event_count) for user_logs matching criteria"""
+    day_col = db.func.date(UserLog.log_timestamp)
+    hour_col = db.func.hour(UserLog.log_timestamp)
+    rows = db.session.query(
+        day_col, hour_col, UserLog.user_id, UserLog.action_type,
+        db.func.sum(db.func.coalesce(UserLog.event_count, 1))
+    ).filter(*criteria).group_by(day_col, hour_col, UserLog.user_id, UserLog.action_type).all()
+    return [(_bucket(d, h), uid or 0, at or '', int(c or 0)) for d, h, uid, at, c in rows]
+
+
+def _score_groups(*criteria):
+    """(bucket_start, user_id, 'anomaly_score', risk_level, count, score_sum) for anomaly_scores matching criteria"""
+    day_col = db.func.date(AnomalyScore.created_at)
+    hour_col = db.func.hour(AnomalyScore.created_at)
+    rows = db.session.query(
+        day_col, hour_col, AnomalyScore.user_id, AnomalyScore.risk_level,
+        db.func.count(AnomalyScore.score_id), db.func.sum(AnomalyScore.risk_score)
+    ).filter(*criteria).group_by(day_col, hour_col, AnomalyScore.user_id, AnomalyScore.risk_level).all()
+    return [
+        (_bucket(d, h), uid or 0, 'anomaly_score', level or 'Normal', int(c or 0), Decimal(str(s or 0)))
+        for d, h, uid, level, c, s in rows
+    ]
+
+
+def _flag_groups(*criteria):
+    """(bucket_start, user_id, 'flag', severity, count, 0) for flags matching criteria"""
+    day_col = db.func.date(FlaggedActivity.flagged_at)
+    hour_col = db.func.hour(FlaggedActivity.flagged_at)
+    rows = db.session.query(
+        day_col, hour_col, UserLog.user_id, FlaggedActivity.severity,
+        db.func.count(FlaggedActivity.flag_id)
+    ).outerjoin(UserLog, FlaggedActivity.log_id == UserLog.log_id).filter(*criteria).group_by(
+        day_col, hour_col, UserLog.user_id, FlaggedActivity.severity
+    ).all()
+    return [(_bucket(d, h), uid or 0, 'flag', sev or 'Low', int(c or 0), Decimal('0')) for d, h, uid, sev, c in rows]
+
+
+def _lock_watermark(name):
+    """Fetch a watermark row FOR UPDATE so concurrent refreshes cannot double count"""
+    wm = RollupWatermark.query.filter_by(name=name).with_for_update().first()
+    if not wm:
+        wm = RollupWatermark(name=name, last_id=0)
+        db.session.add(wm)
+        db.session.flush()
+    return wm
+
+
+def _merge(model, key_names, value_names, groups, *scope):
+    """Add grouped counts onto existing rollup rows, creating missing ones"""
+    if not groups:
+        return
+    lo = min(g[0] for g in groups)
+    hi = max(g[0] for g in groups)
+    existing = {
+        tuple(getattr(r, k) for k in key_names): r
+        for r in model.query.filter(model.bucket_start >= lo, model.bucket_start <= hi, *scope).all()
+    }
+    for g in groups:
+        key = g[:len(key_names)]
+        row = existing.get(key)
+        if row is None:
+            row = model(**dict(zip(key_names, key)), **{name: 0 for name in value_names})
+            db.session.add(row)
+            existing[key] = row
+        for name, value in zip(value_names, g[len(key_names):]):
+            setattr(row, name, (getattr(row, name) or 0) + value)
+
+
+def refresh_rollups():
+    """
+    Fold source rows above each watermark into the rollup tables
+
+    Recent user_logs rows are held back until the activity coalescing window
+    has passed, since their event_count may still grow.
+
+    Returns:
+        Dict of source name -> new watermark
+    """
+    settle = current_app.config.get('ACTIVITY_LOG_COALESCE_SECONDS', 30) + 5
+    try:
+        marks = {}
+
+        wm = _lock_watermark(ACTIVITY_SOURCE)
+        now = datetime.utcnow()
+        unsettled = db.session.query(db.func.min(UserLog.log_id)).filter(
+            UserLog.log_timestamp > now - timedelta(seconds=settle),
+            UserLog.log_timestamp <= now
+        ).scalar()
+        if unsettled:
+            upper = unsettled - 1
+        else:
+            upper = db.session.query(db.func.max(UserLog.log_id)).scalar()
+        if upper and upper > wm.last_id:
+            groups = _activity_groups(UserLog.log_id > wm.last_id, UserLog.log_id <= upper)
+            _merge(ActivityRollup, ACTIVITY_KEYS, ('event_count',), groups)
+            wm.last_id = upper
+        marks[ACTIVITY_SOURCE] = wm.last_id
+
+        wm = _lock_watermark(SCORE_SOURCE)
+        upper = db.session.query(db.func.max(AnomalyScore.score_id)).scalar()
+        if upper and upper > wm.last_id:
+            groups = _score_groups(AnomalyScore.score_id > wm.last_id, AnomalyScore.score_id <= upper)
+            _merge(SecurityRollup, SECURITY_KEYS, ('event_count', 'score_sum'), groups,
+                   SecurityRollup.source == 'anomaly_score')
+            wm.last_id = upper
+        marks[SCORE_SOURCE] = wm.last_id
+
+        wm = _lock_watermark(FLAG_SOURCE)
+        upper = db.session.query(db.func.max(FlaggedActivity.flag_id)).scalar()
+        if upper and upper > wm.last_id:
+            groups = _flag_groups(FlaggedActivity.flag_id > wm.last_id, FlaggedActivity.flag_id <= upper)
+            _merge(SecurityRollup, SECURITY_KEYS, ('event_count', 'score_sum'), groups,
+                   SecurityRollup.source == 'flag')
+            wm.last_id = upper
+        marks[FLAG_SOURCE] = wm.last_id
+
+        db.session.commit()
+        return marks
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute rollups from raw data for [start, end), widened to whole hours
+
+    Only rows at or below the current watermarks are counted, so a rebuild
+    never overlaps with what the next incremental refresh will add.
+    """
+    start = hour_floor(start) if start else None
+    end = hour_ceil(end) if end else None
+
+    def bucket_range(column):
+        criteria = []
+        if start:
+            criteria.append(column >= start)
+        if end:
+            criteria.append(column < end)
+        return criteria
+
+    try:
+        wm = _lock_watermark(ACTIVITY_SOURCE)
+        ActivityRollup.query.filter(*bucket_range(ActivityRollup.bucket_start)).delete(synchronize_session=False)
+        groups = _activity_groups(UserLog.log_id <= wm.last_id, *bucket_range(UserLog.log_timestamp))
+        _merge(ActivityRollup, ACTIVITY_KEYS, ('event_count',), groups)
+
+        wm = _lock_watermark(SCORE_SOURCE)
+        SecurityRollup.query.filter(
+            SecurityRollup.source == 'anomaly_score', *bucket_range(SecurityRollup.bucket_start)
+        ).delete(synchronize_session=False)
+        groups = _score_groups(AnomalyScore.score_id <= wm.last_id, *bucket_range(AnomalyScore.created_at))
+        _merge(SecurityRollup, SECURITY_KEYS, ('event_count', 'score_sum'), groups,
+               SecurityRollup.source == 'anomaly_score')
+
+        wm = _lock_watermark(FLAG_SOURCE)
+        SecurityRollup.query.filter(
+            SecurityRollup.source == 'flag', *bucket_range(SecurityRollup.bucket_start)
+        ).delete(synchronize_session=False)
+        groups = _flag_groups(FlaggedActivity.flag_id <= wm.last_id, *bucket_range(FlaggedActivity.flagged_at))
+        _merge(SecurityRollup, SECURITY_KEYS, ('event_count', 'score_sum'), groups,
+               SecurityRollup.source == 'flag')
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def maybe_refresh_rollups():
+    """Refresh at most once per ROLLUP_REFRESH_SECONDS per process; never raises"""
+    global _last_refresh
+    interval = current_app.config.get('ROLLUP_REFRESH_SECONDS', 60)
+    if time.monotonic() - _last_refresh < interval:
+        return
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        refresh_rollups()
+    except Exception as e:
+        print(f"Error refreshing rollups: {str(e)}")
+    finally:
+        _last_refresh = time.monotonic()
+        _refresh_lock.release()
+
+
+def _watermark(name):
+    return db.session.query(RollupWatermark.last_id).filter_by(name=name).scalar() or 0
+
+
+def activity_counts(start, user_id=None):
+    """
+    Hourly activity counts since start
+
+    Returns:
+        List of (bucket_start, action_type, count)
+    """
+    maybe_refresh_rollups()
+    mark = _watermark(ACTIVITY_SOURCE)
+    boundary = hour_ceil(start)
+
+    query = db.session.query(
+        ActivityRollup.bucket_start, ActivityRollup.action_type, db.func.sum(ActivityRollup.event_count)
+    ).filter(ActivityRollup.bucket_start >= boundary)
+    if user_id:
+        query = query.filter(ActivityRollup.user_id == user_id)
+    rows = [(b, a, int(c or 0)) for b, a, c in query.group_by(ActivityRollup.bucket_start, ActivityRollup.action_type).all()]
+
+    user_filter = [UserLog.user_id == user_id] if user_id else []
+    # Partial first hour, and rows not folded in yet
+    raw = _activity_groups(UserLog.log_timestamp >= start, UserLog.log_timestamp < boundary,
+                           UserLog.log_id <= mark, *user_filter)
+    raw += _activity_groups(UserLog.log_id > mark, UserLog.log_timestamp >= start, *user_filter)
+    rows.extend((b, a, c) for b, _, a, c in raw)
+    return rows
+
+
+def security_counts(start, user_id=None):
+    """
+    Anomaly score and flag totals since start
+
+    Returns:
+        Dict of (source, severity) -> (count, score_sum)
+    """
+    maybe_refresh_rollups()
+    score_mark = _watermark(SCORE_SOURCE)
+    flag_mark = _watermark(FLAG_SOURCE)
+    boundary = hour_ceil(start)
+
+    query = db.session.query(
+        SecurityRollup.source, SecurityRollup.severity,
+        db.func.sum(SecurityRollup.event_count), db.func.sum(SecurityRollup.score_sum)
+    ).filter(SecurityRollup.bucket_start >= boundary)
+    if user_id:
+        query = query.filter(SecurityRollup.user_id == user_id)
+
+    totals = {}
+
+    def add(source, severity, count, score_sum):
+        c, s = totals.get((source, severity), (0, Decimal('0')))
+        totals[(source, severity)] = (c + int(count or 0), s + Decimal(str(score_sum or 0)))
+
+    for source, severity, count, score_sum in query.group_by(SecurityRollup.source, SecurityRollup.severity).all():
+        add(source, severity, count, score_sum)
+
+    score_user = [AnomalyScore.user_id == user_id] if user_id else []
+    flag_user = [UserLog.user_id == user_id] if user_id else []
+    raw = _score_groups(AnomalyScore.created_at >= start, AnomalyScore.created_at < boundary,
+                        AnomalyScore.score_id <= score_mark, *score_user)
+    raw += _score_groups(AnomalyScore.score_id > score_mark, AnomalyScore.created_at >= start, *score_user)
+    raw += _flag_groups(FlaggedActivity.flagged_at >= start, FlaggedActivity.flagged_at < boundary,
+                        FlaggedActivity.flag_id <= flag_mark, *flag_user)
+    raw += _flag_groups(FlaggedActivity.flag_id > flag_mark, FlaggedActivity.flagged_at >= start, *flag_user)
+    for _, _, source, severity, count, score_sum in raw:
+        add(source, severity, count, score_sum)
+
+    return totals
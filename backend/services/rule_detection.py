@@ -425,16 +425,17 @@ class RuleBasedDetection:
         return None
     
     def _check_sensitive_data_access(self, logs, user):
-        views = [l for l in logs if l.action_type.lower() == 'view']
+        # coalesced rows stand for event_count identical views
+        views = sum((getattr(l, 'event_count', None) or 1) for l in logs if l.action_type.lower() == 'view')
         
-        if len(views) >= self.rules['sensitive_data_access']['threshold']:
+        if views >= self.rules['sensitive_data_access']['threshold']:
             return {
                 'rule': 'sensitive_data_access',
                 'name': self.rules['sensitive_data_access']['name'],
                 'mitre_id': self.rules['sensitive_data_access']['mitre_id'],
                 'severity': 'Low',
-                'count': len(views),
-                'description': f"{len(views)} view ops (reconnaissance pattern)",
+                'count': views,
+                'description': f"{views} view ops (reconnaissance pattern)",
                 'points': self.rules['sensitive_data_access']['points']
             }
         return None
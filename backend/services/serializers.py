@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import AnomalyScore, RuleBasedDetection, Order, User
+
+# Relationships each model's to_dict() reads. List endpoints load them with the
+# rows so serializing N rows costs no extra SELECTs.
+SERIALIZER_LOADS = {
+    AnomalyScore: (joinedload(AnomalyScore.user).joinedload(User.role),),
+    RuleBasedDetection: (joinedload(RuleBasedDetection.user),),
+    Order: (joinedload(Order.user), joinedload(Order.item)),
+    User: (joinedload(User.role),),
+}
+
+
+def eager(query, model):
+    """Attach the loader options model.to_dict() needs to a query"""
+    return query.options(*SERIALIZER_LOADS.get(model, ()))
+
+
+@contextmanager
+def count_queries():
+    """
+    Count SQL statements executed inside the block
+
+    Yields:
+        Dict with 'count' and the list of executed 'statements'
+    """
+    counter = {'count': 0, 'statements': []}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+        counter['statements'].append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit, label='block'):
+    """
+    Fail if the block runs more than limit SQL statements
+
+    Raises:
+        AssertionError: listing the statements that were executed
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter['count'] > limit:
+        statements = '\n'.join(s.split('\n')[0][:120] for s in counter['statements'])
+        raise AssertionError(f"{label}: {counter['count']} queries (max {limit})\n{statements}")
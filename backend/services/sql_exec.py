@@ -0,0 +1,111 @@
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import create_engine, event, text
+
+from extensions import db
+from services import metrics
+
+_lock = threading.Lock()
+
+
+class QueryRejected(ValueError):
+    """The planner estimates the query would examine too many rows"""
+
+    def __init__(self, message, estimated_rows):
+        super().__init__(message)
+        self.estimated_rows = estimated_rows
+
+
+def _timeout_statement(dialect, seconds):
+    if getattr(dialect, 'is_mariadb', False):
+        return f"SET SESSION max_statement_time = {float(seconds)}"
+    return f"SET SESSION MAX_EXECUTION_TIME = {int(seconds * 1000)}"
+
+
+def get_engine():
+    """
+    Small dedicated pool for ask-sql queries, so slow analytics SQL cannot take the app's connections
+
+    Every connection has a server-side statement timeout (ASK_SQL_TIMEOUT_SECONDS).
+    Non-MySQL databases (local SQLite) use the app engine without a timeout.
+    """
+    app = current_app._get_current_object()
+    engine = app.extensions.get('ask_sql_engine')
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = app.extensions.get('ask_sql_engine')
+        if engine is not None:
+            return engine
+        if db.engine.dialect.name != 'mysql':
+            engine = db.engine
+        else:
+            timeout = app.config.get('ASK_SQL_TIMEOUT_SECONDS', 10)
+            engine = create_engine(
+                db.engine.url,
+                pool_size=app.config.get('ASK_SQL_POOL_SIZE', 2),
+                max_overflow=0,
+                pool_timeout=app.config.get('ASK_SQL_POOL_TIMEOUT_SECONDS', 5),
+                pool_recycle=280,
+                pool_pre_ping=True,
+                connect_args={'read_timeout': int(timeout) + 5},  # client-side backstop
+            )
+
+            @event.listens_for(engine, 'connect')
+            def _set_timeout(dbapi_conn, _record):
+                cursor = dbapi_conn.cursor()
+                cursor.execute(_timeout_statement(engine.dialect, timeout))
+                cursor.close()
+
+        app.extensions['ask_sql_engine'] = engine
+        return engine
+
+
+def estimate_rows(conn, sql, params):
+    """
+    Rows the planner expects the query to examine, from EXPLAIN
+
+    Tables sharing a select id are joined in nested loops, so their row estimates
+    multiply; separate selects (subqueries, derived tables, unions) add up.
+
+    Returns:
+        (estimated rows, EXPLAIN rows as dicts), or (None, []) when the database has no row estimates
+    """
+    if conn.dialect.name != 'mysql':
+        return None, []
+    plan = [dict(row) for row in conn.execute(text(f"EXPLAIN {sql}"), params).mappings()]
+    per_select = defaultdict(lambda: 1)
+    for row in plan:
+        per_select[row.get('id')] *= max(int(row.get('rows') or 1), 1)
+    return sum(per_select.values()), plan
+
+
+def check_cost(conn, sql, params):
+    """
+    Raises:
+        QueryRejected: if EXPLAIN estimates more than ASK_SQL_MAX_EXAMINED_ROWS examined rows
+    """
+    estimated, plan = estimate_rows(conn, sql, params)
+    if estimated is None:
+        return
+    metrics.set_gauge('ask_sql.last_estimated_rows', estimated)
+    limit = current_app.config.get('ASK_SQL_MAX_EXAMINED_ROWS', 1000000)
+    if estimated > limit:
+        metrics.incr('ask_sql.rejected_cost')
+        scans = [row['table'] for row in plan if row.get('type') == 'ALL']
+        detail = f" (full scans: {', '.join(scans)})" if scans else ""
+        raise QueryRejected(
+            f"Query would examine about {estimated:,} rows, above the {limit:,} limit{detail}. "
+            f"Add a time window or a user/IP filter.",
+            estimated
+        )
+
+
+def is_timeout(error):
+    """True if error is the server aborting a statement at its time limit (MySQL 3024, MariaDB 1969)"""
+    orig = getattr(error, 'orig', None)
+    code = orig.args[0] if orig is not None and getattr(orig, 'args', None) else None
+    return code in (3024, 1969)
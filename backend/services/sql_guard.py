@@ -1,31 +1,278 @@
-import re, sqlparse
+import hashlib
+import re
+
+from services.cache import TTLCache
 
 ALLOWED_TABLES = {"user_logs", "sessions", "users"}
-FORBIDDEN = r"\b(insert|update|delete|drop|alter|create|grant|revoke|truncate)\b"
+MAX_LIMIT = 200
 
-def validate_and_fix(sql: str) -> str:
-    if not sql:
-        raise ValueError("Empty SQL")
-    s = sql.strip().strip(";")
+# Keywords that never belong in a read-only query, wherever they appear (FOR UPDATE, INTO OUTFILE, ...)
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "REPLACE", "MERGE", "UPSERT", "DROP", "ALTER", "CREATE", "RENAME",
+    "TRUNCATE", "GRANT", "REVOKE", "INTO", "OUTFILE", "DUMPFILE", "LOAD", "HANDLER", "CALL", "LOCK",
+}
+FORBIDDEN_FUNCTIONS = {"SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK"}
+
+# Keywords that end a FROM clause's comma-separated table list
+_FROM_END = {
+    "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "ON", "USING",
+    "WINDOW", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "STRAIGHT_JOIN", "FOR",
+}
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w$]))
+  | (?P<param>:\w+|\?|%\(\w+\)s|%s)
+  | (?P<word>[A-Za-z_0-9$][\w$]*)
+  | (?P<punct>[(),.;])
+  | (?P<op>[^\s\w'"`(),.;\#]+)
+  | (?P<bad>.)
+""", re.X | re.S)
+
+# Validation results (fixed SQL or the rejection message) by SQL hash
+validation_cache = TTLCache("sql_guard_cache", ttl=3600, maxsize=1024)
+
+
+class _Tok:
+    __slots__ = ("kind", "value", "upper")
+
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+        self.upper = value.upper() if kind == "word" else None
+
+
+def _parse(s):
+    """
+    Tokenize once into a tree: a list of _Tok leaves and nested lists for parentheses
+
+    Each nested list keeps its '(' and ')' tokens so the tree renders back to the input text.
+    """
+    root = []
+    stack = [root]
+    for m in _TOKEN.finditer(s):
+        kind, value = m.lastgroup, m.group()
+        if kind == "bad":
+            raise ValueError("Unterminated string or identifier")
+        if kind == "comment":
+            raise ValueError("Comments not allowed")
+        tok = _Tok(kind, value)
+        if tok.upper in FORBIDDEN_KEYWORDS:
+            raise ValueError("Write keywords not allowed")
+        if value == "(" and kind == "punct":
+            group = [tok]
+            stack[-1].append(group)
+            stack.append(group)
+        elif value == ")" and kind == "punct":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parentheses")
+            stack.pop().append(tok)
+        else:
+            if value == ";" and kind == "punct":
+                raise ValueError("Multiple statements not allowed")
+            stack[-1].append(tok)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parentheses")
+    return root
+
+
+def _items(node):
+    """Significant items of a node: no whitespace, and no enclosing parentheses for groups"""
+    inner = node[1:-1] if node and isinstance(node[0], _Tok) and node[0].value == "(" else node
+    return [x for x in inner if isinstance(x, list) or x.kind != "ws"]
+
+
+def _render(node):
+    return "".join(_render(x) if isinstance(x, list) else x.value for x in node)
+
+
+def _is_word(item, *words):
+    return isinstance(item, _Tok) and item.kind == "word" and item.upper in words
+
+
+def _is_subquery(items):
+    return bool(items) and _is_word(items[0], "SELECT", "WITH")
+
+
+def _cte_names(items, ctes):
+    """
+    Check a leading WITH clause and collect its names
 
-    if not s.lower().startswith("select"):
+    Returns:
+        Index of the main SELECT in items
+    """
+    i = 1
+    recursive = i < len(items) and _is_word(items[i], "RECURSIVE")
+    if recursive:
+        i += 1
+    while True:
+        name = items[i] if i < len(items) else None
+        if not isinstance(name, _Tok) or name.kind not in ("word", "quoted"):
+            raise ValueError("Malformed WITH clause")
+        i += 1
+        if i < len(items) and isinstance(items[i], list):
+            i += 1  # column list
+        keyword = items[i] if i < len(items) else None
+        body = items[i + 1] if i + 1 < len(items) else None
+        if not _is_word(keyword, "AS") or not isinstance(body, list) or not _is_subquery(_items(body)):
+            raise ValueError("Malformed WITH clause")
+        # Without RECURSIVE a body's reference to its own name means the real table of that
+        # name, so the name becomes visible only after its body is checked
+        cte = name.value.strip("`").lower()
+        _check_query(body, ctes | {cte} if recursive else ctes)
+        ctes.add(cte)
+        i += 2
+        if i < len(items) and isinstance(items[i], _Tok) and items[i].value == ",":
+            i += 1
+            continue
+        return i
+
+
+def _check_source(items, i, ctes):
+    """Check the FROM/JOIN target starting at items[i]; returns the index after its name"""
+    item = items[i]
+    if isinstance(item, list):
+        if not _is_subquery(_items(item)):
+            raise ValueError("Unsupported FROM clause")
+        _check_query(item, ctes)
+        return i + 1
+    if item.kind not in ("word", "quoted"):
+        raise ValueError(f"Unsupported FROM clause: {item.value}")
+    name = item.value.strip("`").lower()
+    if i + 1 < len(items) and isinstance(items[i + 1], _Tok) and items[i + 1].value == ".":
+        raise ValueError(f"Table {_render(items[i:i + 3])} not allowed")
+    if i + 1 < len(items) and isinstance(items[i + 1], list):
+        raise ValueError(f"Table function {item.value} not allowed")
+    if name not in ALLOWED_TABLES and name not in ctes:
+        raise ValueError(f"Table {name} not allowed")
+    return i + 1
+
+
+def _check_query(node, ctes):
+    """Walk one query level: every FROM/JOIN target must be an allowed table, CTE or subquery"""
+    items = _items(node)
+    start = 0
+    if _is_word(items[0] if items else None, "WITH"):
+        ctes = set(ctes)
+        start = _cte_names(items, ctes)
+
+    in_select = in_from = False  # FROM inside EXTRACT(... FROM ...) or TRIM() is not a table reference
+    i = start
+    while i < len(items):
+        item = items[i]
+        if isinstance(item, list):
+            if _is_subquery(_items(item)):
+                _check_query(item, ctes)
+            else:
+                _check_group(item, ctes)
+            i += 1
+            continue
+        if item.kind == "word":
+            if item.upper == "SELECT":
+                in_select, in_from = True, False
+            elif item.upper in FORBIDDEN_FUNCTIONS and i + 1 < len(items) and isinstance(items[i + 1], list):
+                raise ValueError(f"Function {item.value} not allowed")
+            elif in_select and item.upper in ("FROM", "JOIN", "STRAIGHT_JOIN"):
+                in_from = item.upper == "FROM" or in_from
+                if i + 1 >= len(items):
+                    raise ValueError("Missing table after FROM/JOIN")
+                i = _check_source(items, i + 1, ctes)
+                continue
+            elif item.upper in _FROM_END:
+                in_from = False
+        elif in_from and item.value == ",":
+            if i + 1 >= len(items):
+                raise ValueError("Missing table after FROM")
+            i = _check_source(items, i + 1, ctes)
+            continue
+        i += 1
+
+
+def _check_group(node, ctes):
+    """Parenthesized expression that is not itself a query: function args, IN lists, ..."""
+    items = _items(node)
+    for j, item in enumerate(items):
+        if isinstance(item, list):
+            if _is_subquery(_items(item)):
+                _check_query(item, ctes)
+            else:
+                _check_group(item, ctes)
+        elif item.kind == "word" and item.upper in FORBIDDEN_FUNCTIONS and j + 1 < len(items) and isinstance(items[j + 1], list):
+            raise ValueError(f"Function {item.value} not allowed")
+
+
+def _check_limit(items):
+    """
+    Enforce the outer query's LIMIT: clamp literals above MAX_LIMIT
+
+    Returns:
+        False when the statement has no top-level LIMIT
+    """
+    for i in range(len(items) - 1, -1, -1):
+        if _is_word(items[i], "LIMIT"):
+            args = items[i + 1:i + 4]
+            if len(args) >= 3 and isinstance(args[1], _Tok) and args[1].value == ",":  # LIMIT offset, count
+                count = args[2]
+            else:
+                count = args[0] if args else None
+            if not isinstance(count, _Tok) or count.kind != "number" or not count.value.isdigit():
+                raise ValueError("LIMIT must be a number")
+            if int(count.value) > MAX_LIMIT:
+                count.value = str(MAX_LIMIT)
+            return True
+    return False
+
+
+def _validate(sql):
+    s = sql.strip().rstrip(";").strip()
+    tree = _parse(s)
+    items = _items(tree)
+
+    if not _is_subquery(items):
         raise ValueError("Only SELECT allowed")
 
-    if re.search(r";\s*\S", s):
-        raise ValueError("Multiple statements not allowed")
+    _check_query(tree, set())
+
+    if not _check_limit(items):
+        return f"{s} LIMIT {MAX_LIMIT}"
+    return _render(tree)
+
+
+def normalize(sql):
+    """sql with whitespace outside string literals collapsed, for use as a cache key"""
+    return " ".join(m.group() for m in _TOKEN.finditer(sql.strip().rstrip(";")) if m.lastgroup != "ws")
 
-    if re.search(FORBIDDEN, s, re.I):
-        raise ValueError("Write keywords not allowed")
 
-    if "limit" not in s.lower():
-        s += " LIMIT 200"
+def validate_and_fix(sql: str) -> str:
+    """
+    Check that sql is a single read-only SELECT over the allowed tables, with a LIMIT
+
+    The statement is tokenized once into a parenthesis tree; statement type, every
+    FROM/JOIN target (including subqueries and CTEs) and the outer LIMIT are checked
+    on that tree. Results, including rejections, are memoized by SQL hash.
+
+    Returns:
+        The SQL to run (LIMIT added or clamped to MAX_LIMIT)
+
+    Raises:
+        ValueError: if the SQL is empty or not allowed
+    """
+    if not sql or not sql.strip():
+        raise ValueError("Empty SQL")
 
-    # FROM/JOIN table allow-list
-    tbls = re.findall(r"\bfrom\s+([`a-zA-Z0-9_\.]+)|\bjoin\s+([`a-zA-Z0-9_\.]+)", s, re.I)
-    for a, b in tbls:
-        t = (a or b).split(".")[-1].strip("`")
-        if t not in ALLOWED_TABLES:
-            raise ValueError(f"Table {t} not allowed")
+    key = hashlib.sha1(sql.encode("utf-8")).hexdigest()
+    cached = validation_cache.get(key)
+    if cached is None:
+        try:
+            cached = (True, _validate(sql))
+        except ValueError as e:
+            cached = (False, str(e))
+        validation_cache.set(key, cached)
 
-    # Formatting
-    return sqlparse.format(s, reindent=True, keyword_case="upper")
+    ok, result = cached
+    if not ok:
+        raise ValueError(result)
+    return result
@@ -0,0 +1,52 @@
+import hashlib
+import os
+
+from sqlalchemy import text
+
+from services.activity_logger import get_logger_stats
+from services.cache import TTLCache
+from services.responses import dumps
+from services.sql_guard import normalize
+
+# Results are reused while no new log or session has been written, for at most this long
+SQL_RESULT_CACHE_TTL = int(os.getenv("SQL_RESULT_CACHE_TTL", "60"))
+SQL_RESULT_CACHE_MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+result_cache = TTLCache("sql_result_cache", ttl=SQL_RESULT_CACHE_TTL, maxsize=1024,
+                        maxbytes=SQL_RESULT_CACHE_MAX_BYTES)
+
+# All indexed, so this is three index lookups
+_VERSION_SQL = text(
+    "SELECT (SELECT MAX(log_id) FROM user_logs), (SELECT MAX(start_time) FROM sessions),"
+    " (SELECT MAX(created_at) FROM anomaly_scores)"
+)
+
+
+def data_version(conn):
+    """
+    Version of the rows ask-sql reads: changes whenever a log or session is added
+
+    Some rows change in place. The baseline detector sets user_logs.is_flagged in the
+    same commit as it writes or refreshes an anomaly score, so the latest score time
+    covers flags; logout ends a session while writing a Logout log. Coalescing only
+    bumps event_count: this worker's coalesce count is part of the version, and
+    coalescing in other workers is bounded by SQL_RESULT_CACHE_TTL.
+    """
+    row = conn.execute(_VERSION_SQL).one()
+    return tuple(str(v) for v in row) + (get_logger_stats()["coalesced"],)
+
+
+def _key(sql, params, version):
+    raw = dumps([normalize(sql), sorted((params or {}).items()), version])
+    return hashlib.sha1(raw).hexdigest()
+
+
+def lookup(sql, params, version):
+    """(columns, rows) from an earlier run of the same query at the same data version, or None"""
+    return result_cache.get(_key(sql, params, version))
+
+
+def store(sql, params, version, columns, rows):
+    """Remember a result; entries are bounded by their JSON size (SQL_RESULT_CACHE_MAX_BYTES in total)"""
+    size = len(dumps([columns, rows]))
+    result_cache.set(_key(sql, params, version), (columns, rows), size=size)
@@ -0,0 +1,83 @@
+import hashlib
+import re
+
+from flask import current_app
+
+from services.cache import TTLCache
+
+# Validated SQL per normalized question, shared by ask-sql requests in this worker
+template_cache = TTLCache('sql_template_cache', ttl=3600, maxsize=256)
+
+_NUMBER = re.compile(r'\d+')
+_PLACEHOLDER = re.compile(r'\{n(\d+)\}')
+
+
+def normalize_question(question):
+    """
+    Reduce a question to its cache key shape and pull out its numeric literals
+
+    'Exports by user 3 ' -> ('exports by user {n}', [3])
+    """
+    text = re.sub(r'\s+', ' ', question.strip().lower()).rstrip('?.! ')
+    numbers = [int(n) for n in _NUMBER.findall(text)]
+    return _NUMBER.sub('{n}', text), numbers
+
+
+def _sql_literal(value):
+    # A bare integer in SQL: not part of an identifier, decimal or longer number
+    return re.compile(r'(?<![\w.])' + str(value) + r'(?![\w.])')
+
+
+def make_template(sql, numbers):
+    """
+    Replace the question's numbers in sql with {n0}, {n1}, ... placeholders
+
+    Returns:
+        The template, or None if the numbers cannot be mapped unambiguously
+        (a number repeats in the question, or does not appear exactly once in the SQL,
+        e.g. 'user 1' with 'user_id = 1 AND is_flagged = 1')
+    """
+    if len(set(numbers)) != len(numbers):
+        return None
+    template = sql
+    for i, value in enumerate(numbers):
+        pattern = _sql_literal(value)
+        if len(pattern.findall(template)) != 1:
+            return None
+        template = pattern.sub('{n%d}' % i, template)
+    return template
+
+
+def bind(template, numbers):
+    """Fill a template's placeholders with this question's numbers"""
+    return _PLACEHOLDER.sub(lambda m: str(numbers[int(m.group(1))]), template)
+
+
+def _fingerprint(prompt, model):
+    # Entries are tied to the prompt and model that produced them
+    return hashlib.sha1(f'{model}\n{prompt}'.encode('utf-8')).hexdigest()[:12]
+
+
+def lookup(question, prompt, model):
+    """SQL for question re-bound from a cached template, or None"""
+    shape, numbers = normalize_question(question)
+    entry = template_cache.get((_fingerprint(prompt, model), shape))
+    if entry is None:
+        return None
+    template, count = entry
+    if count != len(numbers):
+        return None
+    return bind(template, numbers)
+
+
+def store(question, sql, prompt, model):
+    """Remember validated, successfully executed SQL for question's shape"""
+    shape, numbers = normalize_question(question)
+    template = make_template(sql, numbers)
+    if template is None:
+        return
+    template_cache.set(
+        (_fingerprint(prompt, model), shape),
+        (template, len(numbers)),
+        ttl=current_app.config.get('SQL_TEMPLATE_CACHE_TTL_SECONDS', 3600)
+    )
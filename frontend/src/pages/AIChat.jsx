@@ -2,7 +2,7 @@ import { useState, useRef, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
 import { logActivity } from "../services/activityLogger";
-import { askSql, chat } from "../services/ai";
+import { askSql, chatStream, streamExplanation } from "../services/ai";
 import "./AIChat.css";
 
 export default function AIChat() {
@@ -13,11 +13,15 @@ export default function AIChat() {
   const [sqlBlock, setSqlBlock] = useState(null);
   const [loading, setLoading] = useState(false);
   const endRef = useRef(null);
+  const chatAbortRef = useRef(null);
 
   useEffect(() => {
     endRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [history, sqlBlock]);
 
+  // Stop any in-flight generation when leaving the page
+  useEffect(() => () => chatAbortRef.current?.abort(), []);
+
   async function onAskSql() {
     if (!q.trim()) return;
     setLoading(true);
@@ -25,10 +29,21 @@ export default function AIChat() {
       const nl = q.trim();
       setHistory(h => [...h, { role: "user", content: nl }]);
       const data = await askSql(nl);
-      // show SQL card + assistant message
+      // show SQL card right away; the explanation is generated in the background
       setSqlBlock({ sql: data.sql, columns: data.columns || [], rows: data.rows || [] });
-      setHistory(h => [...h, { role: "assistant", content: data.explanation || "Here are the results." }]);
       setQ("");
+      if (data.explanation || !data.explanation_id) {
+        setHistory(h => [...h, { role: "assistant", content: data.explanation || "Here are the results." }]);
+      } else {
+        // Tag the bubble so later messages don't get overwritten while it fills in
+        const bubbleId = `explain-${data.explanation_id}-${Date.now()}`;
+        setHistory(h => [...h, { role: "assistant", content: "Here are the results.", id: bubbleId }]);
+        setLoading(false);
+        const setExplanation = (content) => setHistory(h => h.map(m => (m.id === bubbleId ? { ...m, content } : m)));
+        chatAbortRef.current = new AbortController();
+        await streamExplanation(data.explanation_id, setExplanation, { signal: chatAbortRef.current.signal })
+          .catch(() => {});
+      }
     } catch (e) {
       setHistory(h => [...h, { role: "assistant", content: `Error: ${e.message || e}` }]);
     } finally {
@@ -41,14 +56,19 @@ export default function AIChat() {
     setLoading(true);
     try {
       const msg = q.trim();
-      setHistory(h => [...h, { role: "user", content: msg }]);
-      const data = await chat(msg, history);
-      setHistory(h => [...h, { role: "assistant", content: data.reply || "(no reply)" }]);
+      setHistory(h => [...h, { role: "user", content: msg }, { role: "assistant", content: "" }]);
       setQ("");
       setSqlBlock(null);
+      // Fill the assistant bubble in as tokens arrive
+      const setReply = (content) => setHistory(h => [...h.slice(0, -1), { role: "assistant", content }]);
+      chatAbortRef.current = new AbortController();
+      const reply = await chatStream(msg, history, setReply, { signal: chatAbortRef.current.signal });
+      if (!reply) setReply("(no reply)");
     } catch (e) {
-      setHistory(h => [...h, { role: "assistant", content: `Error: ${e.message || e}` }]);
+      if (e.name === "AbortError") return;
+      setHistory(h => [...h.slice(0, -1), { role: "assistant", content: `Error: ${e.message || e}` }]);
     } finally {
+      chatAbortRef.current = null;
       setLoading(false);
     }
   }
@@ -3,6 +3,7 @@ import axios from 'axios'
 import { useNavigate } from 'react-router-dom'
 import { useAuth } from '../context/AuthContext'
 import { logActivity } from '../services/activityLogger'
+import analyticsService from '../services/analyticsService'
 import './Analytics.css'
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000'
 
@@ -33,6 +34,18 @@ const Analytics = () => {
     fetchData()
   }, [activeTab])
 
+  // Push new detections into the lists as they are saved instead of re-fetching
+  useEffect(() => {
+    const unsubscribe = analyticsService.streamAlerts((type, item) => {
+      if (type === 'rule_detection') {
+        setRuleDetections(prev => [item, ...prev.filter(d => d.detection_id !== item.detection_id)])
+      } else if (type === 'anomaly_score') {
+        setBaselineAnomalies(prev => [item, ...prev.filter(a => a.score_id !== item.score_id)])
+      }
+    })
+    return unsubscribe
+  }, [])
+
   const runAllDetections = async () => {
     setAutoRunning(true)
     const token = localStorage.getItem('token')
@@ -23,3 +23,54 @@ export async function chat(message, history = [], token) {
   });
   return res.json();
 }
+
+// Streams the reply as NDJSON ({"delta"} lines, then {"done"}); onDelta receives the text so far.
+// Abort the signal to stop generation server-side.
+export async function chatStream(message, history = [], onDelta, { token, signal } = {}) {
+  const res = await fetch(`${API}/api/ai/chat`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      ...(token ? { Authorization: `Bearer ${token}` } : {})
+    },
+    body: JSON.stringify({ message, history, stream: true }),
+    signal
+  });
+  return readDeltas(res, onDelta);
+}
+
+// Streams an ask-sql explanation by its explanation_id; onDelta receives the text so far.
+export async function streamExplanation(explanationId, onDelta, { signal } = {}) {
+  const res = await fetch(`${API}/api/ai/explanations/${explanationId}/stream`, { signal });
+  return readDeltas(res, onDelta);
+}
+
+// Reads an NDJSON {"delta"} / {"done"} / {"error"} response, returning the full text
+async function readDeltas(res, onDelta) {
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.detail || data.error || `HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const evt = JSON.parse(line);
+      if (evt.error) throw new Error(evt.detail || evt.error);
+      if (evt.delta) {
+        reply += evt.delta;
+        onDelta(reply);
+      }
+    }
+  }
+  return reply;
+}
@@ -77,6 +77,61 @@ const analyticsService = {
     }
   },
 
+  // Subscribe to new detections, anomaly scores and flags (Server-Sent Events).
+  // EventSource cannot send the Authorization header, so the stream is read with fetch.
+  // Reconnects with Last-Event-ID after the server ends the stream. Returns an unsubscribe function.
+  streamAlerts(onEvent, { severity } = {}) {
+    const controller = new AbortController()
+    let lastEventId = null
+    let retryMs = 5000
+
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` }
+          if (lastEventId) headers['Last-Event-ID'] = lastEventId
+          const params = severity ? `?severity=${encodeURIComponent(severity)}` : ''
+          const response = await fetch(`${API_URL}/api/analytics/alerts/stream${params}`, {
+            headers,
+            signal: controller.signal,
+          })
+          if (!response.ok) throw new Error(`Stream failed with status ${response.status}`)
+
+          const reader = response.body.getReader()
+          const decoder = new TextDecoder()
+          let buffer = ''
+          for (;;) {
+            const { value, done } = await reader.read()
+            if (done) break
+            buffer += decoder.decode(value, { stream: true })
+            const messages = buffer.split('\n\n')
+            buffer = messages.pop()
+            for (const message of messages) {
+              let id = null
+              let type = 'message'
+              let data = ''
+              for (const line of message.split('\n')) {
+                if (line.startsWith('id: ')) id = line.slice(4)
+                else if (line.startsWith('event: ')) type = line.slice(7)
+                else if (line.startsWith('data: ')) data += line.slice(6)
+                else if (line.startsWith('retry: ')) retryMs = parseInt(line.slice(7), 10) || retryMs
+              }
+              if (id) lastEventId = id
+              if (data) onEvent(type, JSON.parse(data))
+            }
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return
+          console.error('Alert stream error:', error)
+        }
+        await new Promise((resolve) => setTimeout(resolve, retryMs))
+      }
+    }
+
+    connect()
+    return () => controller.abort()
+  },
+
   // Error handler
   handleError(error) {
     if (error.response) {
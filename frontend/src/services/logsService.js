@@ -36,7 +36,9 @@ const logsService = {
       if (filters.start_date) params.append('start_date', filters.start_date)
       if (filters.end_date) params.append('end_date', filters.end_date)
       if (filters.limit) params.append('limit', filters.limit)
+      if (filters.cursor) params.append('cursor', filters.cursor)
       
+      // Returns { logs, next_cursor }; pass next_cursor back as filters.cursor for the next page
       const response = await api.get(`/logs/?${params.toString()}`)
       return response.data
     } catch (error) {
@@ -51,7 +53,10 @@ const logsService = {
       
       if (filters.user_id) params.append('user_id', filters.user_id)
       if (filters.active_only) params.append('active_only', filters.active_only)
+      if (filters.limit) params.append('limit', filters.limit)
+      if (filters.cursor) params.append('cursor', filters.cursor)
       
+      // Returns { sessions, next_cursor }
       const response = await api.get(`/logs/sessions?${params.toString()}`)
       return response.data
     } catch (error) {
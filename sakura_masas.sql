@@ -35,7 +35,12 @@ CREATE TABLE `anomaly_scores` (
   `risk_score` decimal(5,2) DEFAULT NULL,
   `risk_level` enum('Normal','Low Alert','Medium Alert','High Alert') DEFAULT NULL,
   `explanation` text DEFAULT NULL,
-  `created_at` timestamp NOT NULL DEFAULT current_timestamp()
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `per_feature_stats` longtext DEFAULT NULL,  -- JSON: {feature: {mean, std}}
+  `causes_detail` longtext DEFAULT NULL,  -- JSON list of {name, code, value, points}
+  `findings` longtext DEFAULT NULL,  -- JSON list of detector findings
+  `std_pct` int(11) DEFAULT NULL,
+  `deviation_pct` int(11) DEFAULT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -289,7 +294,8 @@ CREATE TABLE `user_logs` (
   `user_agent` varchar(255) DEFAULT NULL,
   `geo_location` varchar(100) DEFAULT NULL,
   `is_flagged` tinyint(1) DEFAULT 0,
-  `log_type` enum('ui_event','system','auth','data_access') DEFAULT 'ui_event'
+  `log_type` enum('ui_event','system','auth','data_access') DEFAULT 'ui_event',
+  `event_count` int(11) NOT NULL DEFAULT 1  -- Number of coalesced identical events
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -2174,6 +2180,75 @@ INSERT INTO `user_logs` (`log_id`, `user_id`, `action_type`, `action_detail`, `p
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `activity_rollup_hourly`
+-- Maintained incrementally from user_logs (see backend/services/rollups.py)
+--
+
+DROP TABLE IF EXISTS `activity_rollup_hourly`;
+CREATE TABLE `activity_rollup_hourly` (
+  `bucket_start` datetime NOT NULL,
+  `user_id` int(11) NOT NULL,  -- 0 for logs without a user
+  `action_type` varchar(50) NOT NULL,
+  `event_count` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`bucket_start`, `user_id`, `action_type`),
+  KEY `idx_activity_rollup_user` (`user_id`, `bucket_start`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `security_rollup_hourly`
+-- Hourly anomaly score (by risk_level) and flag (by severity) counts
+--
+
+DROP TABLE IF EXISTS `security_rollup_hourly`;
+CREATE TABLE `security_rollup_hourly` (
+  `bucket_start` datetime NOT NULL,
+  `user_id` int(11) NOT NULL,  -- 0 for rows without a user
+  `source` enum('anomaly_score','flag') NOT NULL,
+  `severity` varchar(20) NOT NULL,
+  `event_count` int(11) NOT NULL DEFAULT 0,
+  `score_sum` decimal(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (`bucket_start`, `user_id`, `source`, `severity`),
+  KEY `idx_security_rollup_user` (`user_id`, `bucket_start`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `rollup_watermarks`
+-- Highest source row id already folded into the rollups
+--
+
+DROP TABLE IF EXISTS `rollup_watermarks`;
+CREATE TABLE `rollup_watermarks` (
+  `name` varchar(50) NOT NULL,
+  `last_id` int(11) NOT NULL DEFAULT 0,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `user_risk_daily`
+-- Per-user daily risk series, updated as detections and flags are saved
+--
+
+DROP TABLE IF EXISTS `user_risk_daily`;
+CREATE TABLE `user_risk_daily` (
+  `user_id` int(11) NOT NULL,
+  `day` date NOT NULL,
+  `max_score` decimal(5,2) NOT NULL DEFAULT 0.00,
+  `score_sum` decimal(12,2) NOT NULL DEFAULT 0.00,
+  `detections` int(11) NOT NULL DEFAULT 0,
+  `flags` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`,`day`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure for view `flagged_activity`
 --
@@ -2211,7 +2286,8 @@ CREATE ALGORITHM=UNDEFINED DEFINER=`root`@`localhost` SQL SECURITY DEFINER VIEW
 --
 ALTER TABLE `anomaly_scores`
   ADD PRIMARY KEY (`score_id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id` (`user_id`),
+  ADD KEY `idx_anomaly_scores_created_at` (`created_at`);
 
 --
 -- Indexes for table `inventory_items`
@@ -2239,7 +2315,8 @@ ALTER TABLE `roles`
 --
 ALTER TABLE `sessions`
   ADD PRIMARY KEY (`session_id`),
-  ADD KEY `user_id` (`user_id`);
+  ADD KEY `user_id` (`user_id`),
+  ADD KEY `idx_sessions_start_time` (`start_time`, `session_id`);
 
 --
 -- Indexes for table `users`